@@ -1,41 +1,364 @@
+import copy
 import random
-
-pieceScore = {"K": 0, "Q": 10, "R": 5, "B": 3, "N": 3, "p": 1}
+import threading
+import time
+import Evaluation
+import MoveOrdering
+import Tablebase
+import TranspositionTable
+from Evaluation import pieceScore
 CHECKMATE = 1000
 STALEMATE = 0       # values for pieces and results for games
+DEPTH = 3           # how many moves ahead findBestMove looks
+MAXDEPTH = 64       # depth limit for searches that are stopped by time instead
+TABLEBASEWIN = CHECKMATE - 100  # score of a tablebase win, less the plies to mate so quicker mates score higher
+# a checkmate scores CHECKMATE less the plies from the root to it, so a quicker mate scores higher. Any score further
+# from 0 than TABLEBASEWIN is a forced mate
+DELTAMARGIN = 2     # a capture is skipped in quiescence when even winning this much more could not reach alpha
 
 
 def findRandomMove(validMoves):
     return validMoves[random.randint(0, len(validMoves) -1)]
 
 
-def findGreedyMove(gs, validMoves):   # greedy algorithm (looks at material alone)
-    turnMultiplier = 1 if gs.whitetomove else -1    # using this makes that both sides
-                                                    # are trying to get a high positive score
-    OpponentsMinMaxScore = CHECKMATE    # black's perspective (start with worst case then lower it) using minimax
+def findGreedyMove(gs, validMoves, tt=None):   # greedy algorithm (looks one move ahead for each side)
+    OpponentsMinMaxScore = CHECKMATE    # opponent's perspective (start with worst case then lower it) using minimax
     bestPlayerMove = None
     random.shuffle(validMoves)
+    if tt is not None:
+        tt.newSearch()
     for playerMove in validMoves:
         gs.makeMove(playerMove)
-        opponentsMoves = gs.getValidMoves() # looking at opponents move (looking 1 move further)
-        OpponentsMaxScore = -CHECKMATE
-        for opponentsMoves in opponentsMoves:
-            gs.makeMove(opponentsMoves)
-            if gs.Checkmate:
-                score = -turnMultiplier * CHECKMATE   # make sure that checkmate will be best move if possible
-            elif gs.Stalemate:
-                score = STALEMATE   # bad score since stalemate ends in draw and not win
+        entry = tt.probe(gs.zobristKey) if tt is not None else None  # opponents best reply may already be known
+        if entry is not None and entry[0] >= 1 and entry[2] == TranspositionTable.EXACT:
+            OpponentsMaxScore = scoreFromTable(entry[1], 1)
+        else:
+            opponentsMoves = gs.getValidMoves() # looking at opponents move (looking 1 move further)
+            if len(opponentsMoves) == 0:    # the flags were just set by getValidMoves for this position
+                OpponentsMaxScore = -(CHECKMATE - 1) if gs.Checkmate else STALEMATE
             else:
-                score = -turnMultiplier * scoreMaterial(gs.board)   # turned negative since we are looking an extra move
-            if score > OpponentsMaxScore:    # since black wants negative score
-                OpponentsMaxScore = score
-            gs.undoMove()
-        if OpponentsMaxScore < OpponentsMinMaxScore:
+                OpponentsMaxScore = -CHECKMATE
+            bestReply = TranspositionTable.NOMOVE
+            for opponentsMoves in opponentsMoves:
+                gs.makeMove(opponentsMoves)
+                # captures are played out so the score is not taken half way through an exchange, and a checkmate
+                # is found by quiescence (scored from the side to move, so turned negative for the opponent)
+                score = -quiescence(gs, -CHECKMATE, CHECKMATE, ply=2)
+                if score > OpponentsMaxScore:
+                    OpponentsMaxScore = score
+                    bestReply = opponentsMoves.moveID
+                gs.undoMove()
+            if tt is not None:  # score is from the opponents side, who is the player to move in this position
+                tt.store(gs.zobristKey, 1, scoreToTable(OpponentsMaxScore, 1), TranspositionTable.EXACT, bestReply)
+        if OpponentsMaxScore < OpponentsMinMaxScore or bestPlayerMove is None:
             OpponentsMinMaxScore = OpponentsMaxScore
             bestPlayerMove = playerMove
         gs.undoMove()
     return bestPlayerMove
 
+"""
+Iterative deepening: searches 1 move deep, then 2 and so on up to depth, starting each search with the best move of
+the last one (which makes the alpha beta cut offs much better). Returns the best move of the deepest finished search
+"""
+
+
+def findBestMove(gs, validMoves, depth=DEPTH, tt=None, control=None, orderer=None, book=None, tablebases=None):
+    if len(validMoves) == 0:
+        return None
+    if book is not None:    # positions in the opening book are played from the book without searching
+        bookMove = book.findMove(gs, validMoves)
+        if bookMove is not None:
+            return bookMove
+    if tablebases is not None:  # so are endgames the tablebases know the result of
+        tablebaseMove = tablebases.findMove(gs, validMoves)
+        if tablebaseMove is not None:
+            if control is not None:
+                control.score = tablebaseScore(tablebases.probe(gs))
+            return tablebaseMove
+    if tt is not None:
+        tt.newSearch()
+    if orderer is None:
+        orderer = MoveOrdering.MoveOrderer(pieceScore)
+    orderer.newSearch()
+    moves = validMoves[:]
+    random.shuffle(moves)   # so the same position does not always get the same move out of equally good ones
+    orderer.orderMoves(moves)   # sorting keeps the shuffled order between moves that score the same
+    bestMove = moves[0]
+    for currentDepth in range(1, depth + 1):
+        try:
+            depthBestMove, bestScore = searchRoot(gs, moves, currentDepth, tt, control, orderer, tablebases)
+        except SearchTimeout:
+            break   # ran out of time part way through so this depth is thrown away
+        bestMove = depthBestMove
+        moves.remove(bestMove)
+        moves.insert(0, bestMove)
+        if control is not None:
+            control.depthReached = currentDepth
+            control.score = bestScore
+        if isMateScore(bestScore):  # found a forced checkmate so there is nothing better to look for
+            break
+    return bestMove
+
+
+def searchRoot(gs, moves, depth, tt, control=None, orderer=None, tablebases=None):
+    alpha = -CHECKMATE - 1
+    beta = CHECKMATE + 1
+    bestScore = -CHECKMATE - 1
+    bestMove = moves[0]
+    for move in moves:
+        gs.makeMove(move)
+        try:
+            score = -findMoveNegaMaxAlphaBeta(gs, depth - 1, -beta, -alpha, tt, control, orderer, 1, tablebases)
+        finally:
+            gs.undoMove()   # the board has to be put back even when the search is stopped
+        if score > bestScore:
+            bestScore = score
+            bestMove = move
+        if score > alpha:
+            alpha = score
+    return bestMove, bestScore
+
+
+"""
+Negamax with alpha beta pruning: scores the position from the side to move's point of view (positive = good for the
+player to move) so both sides can use the same code. alpha is the score the player to move is already guaranteed and
+beta is the score the opponent is guaranteed, so once alpha reaches beta the opponent will never allow this position
+and the rest of the moves do not need to be searched
+"""
+
+
+def findMoveNegaMaxAlphaBeta(gs, depth, alpha, beta, tt=None, control=None, orderer=None, ply=0, tablebases=None):
+    if control is not None:
+        control.nodes += 1
+        if control.nodes % 64 == 0:
+            control.checkTime()     # raises SearchTimeout once the time is up or the search is cancelled
+    if ply > 0 and gs.isRepetition():
+        # going back to an earlier position means either side can repeat it again, so it is scored as the draw it
+        # will become (checked before the transposition table since stored scores do not know the moves played)
+        return STALEMATE
+    if ply > 0 and gs.halfmoveClock >= 100:
+        # fifty moves without a capture or pawn move is a draw, unless the last of them was checkmate
+        if gs.inCheck() and len(gs.getValidMoves()) == 0:
+            return -(CHECKMATE - ply)
+        return STALEMATE
+    if tablebases is not None:
+        result = tablebases.probe(gs)
+        if result is not None:
+            return tablebaseScore(result)   # the exact result so there is nothing to search
+    if depth == 0:
+        return quiescence(gs, alpha, beta, control, orderer, ply)
+
+    alphaOriginal = alpha
+    ttMove = TranspositionTable.NOMOVE
+    if tt is not None:
+        entry = tt.probe(gs.zobristKey)
+        if entry is not None:
+            entryDepth, entryScore, bound, ttMove = entry
+            entryScore = scoreFromTable(entryScore, ply)
+            if entryDepth >= depth:  # an earlier search of this position went at least as deep
+                if bound == TranspositionTable.EXACT:
+                    return entryScore
+                elif bound == TranspositionTable.LOWERBOUND:
+                    alpha = max(alpha, entryScore)
+                else:
+                    beta = min(beta, entryScore)
+                if alpha >= beta:
+                    return entryScore
+
+    # the best move found here last time is searched first, then the captures and then the quiet moves, each only
+    # generated once the ones before have been searched without a cut off
+    sortStage = None
+    if orderer is not None:
+        sortStage = lambda stageMoves: orderer.orderMoves(stageMoves, ply)
+    maxScore = -CHECKMATE
+    bestMove = None
+    for i, move in enumerate(gs.getStagedMoves(ttMove, sortStage)):
+        gs.makeMove(move)
+        try:
+            score = -findMoveNegaMaxAlphaBeta(gs, depth - 1, -beta, -alpha, tt, control, orderer, ply + 1,
+                                              tablebases)
+        finally:
+            gs.undoMove()
+        if score > maxScore or bestMove is None:
+            maxScore = score
+            bestMove = move
+        if maxScore > alpha:
+            alpha = maxScore
+        if alpha >= beta:
+            if orderer is not None:
+                orderer.recordCutoff(move, ply, depth, i)
+            break   # the opponent will not let this position happen so the other moves do not matter
+
+    if bestMove is None:    # no valid moves
+        return -(CHECKMATE - ply) if gs.inCheck() else STALEMATE    # checkmated or stalemate
+
+    if tt is not None:
+        if maxScore <= alphaOriginal:
+            bound = TranspositionTable.UPPERBOUND
+        elif maxScore >= beta:
+            bound = TranspositionTable.LOWERBOUND
+        else:
+            bound = TranspositionTable.EXACT
+        tt.store(gs.zobristKey, depth, scoreToTable(maxScore, ply), bound, bestMove.moveID)
+    return maxScore
+
+
+captureOrderer = MoveOrdering.MoveOrderer(pieceScore)  # orders captures for quiescence searches run without an orderer
+
+
+"""
+Quiescence search: at the end of the main search the captures (and promotions) are played out until the position is
+quiet, so a position is never scored half way through an exchange. The player to move can also stand pat (keep the
+static score) instead of capturing, since nobody is forced to capture. Captures that could not get the score up to
+alpha even when winning the captured piece plus DELTAMARGIN are not searched (delta pruning). A player left in check
+by the main search has every move searched instead, since standing pat is not allowed (checks further into the
+captures are not looked for, which would make the search much bigger)
+"""
+
+
+def quiescence(gs, alpha, beta, control=None, orderer=None, ply=0, qply=0):
+    if control is not None:
+        control.nodes += 1
+        if control.nodes % 64 == 0:
+            control.checkTime()
+    turnMultiplier = 1 if gs.whitetomove else -1
+    standPat = turnMultiplier * scoreBoard(gs)
+    inCheck = qply == 0 and gs.inCheck()
+    if inCheck:
+        moves = gs.getValidMoves()
+        if gs.Checkmate:
+            return -(CHECKMATE - ply)
+        maxScore = -CHECKMATE
+    else:
+        if standPat >= beta:
+            return standPat
+        moves = gs.getCaptureMoves()
+        maxScore = standPat
+        if standPat > alpha:
+            alpha = standPat
+
+    (orderer or captureOrderer).orderMoves(moves, ply)  # most valuable victim first cuts the captures down the most
+    for move in moves:
+        if not inCheck:
+            gain = pieceScore[move.pieceCaptured[1]] if move.pieceCaptured != "--" else 0
+            if move.isPawnPromotion:
+                gain += pieceScore["Q"] - pieceScore["p"]
+            if standPat + gain + DELTAMARGIN <= alpha:
+                continue
+        gs.makeMove(move)
+        try:
+            score = -quiescence(gs, -beta, -alpha, control, orderer, ply + 1, qply + 1)
+        finally:
+            gs.undoMove()
+        if score > maxScore:
+            maxScore = score
+            if score > alpha:
+                alpha = score
+                if alpha >= beta:
+                    break
+    return maxScore
+
+
+def isMateScore(score):
+    return abs(score) > TABLEBASEWIN
+
+
+"""
+Mate scores count plies from the root, but a position stored in the transposition table can be reached at a different
+ply, so they are stored counting plies from the position itself and turned back when they are probed
+"""
+
+
+def scoreToTable(score, ply):
+    if score > TABLEBASEWIN:
+        return score + ply
+    if score < -TABLEBASEWIN:
+        return score - ply
+    return score
+
+
+def scoreFromTable(score, ply):
+    if score > TABLEBASEWIN:
+        return score - ply
+    if score < -TABLEBASEWIN:
+        return score + ply
+    return score
+
+
+def tablebaseScore(result):  # a tablebase probe result as a score for the player to move
+    outcome, plies = result
+    if outcome == Tablebase.WIN:
+        return TABLEBASEWIN - plies
+    elif outcome == Tablebase.LOSS:
+        return -TABLEBASEWIN + plies
+    return STALEMATE
+
+
+"""
+Time management for a search. The time for the move is either fixed (movetime) or worked out from the clock left and
+the increment. The search calls checkTime as it goes, which stops it once the deadline passes or it is cancelled
+"""
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+class SearchController():
+    def __init__(self, movetime=None, clock=None, increment=0, movesToGo=30):
+        if movetime is None and clock is not None:
+            # spread the clock over the moves still to play, plus most of the increment, never using it all up
+            movetime = min(clock / movesToGo + increment * 0.8, clock * 0.5)
+        self.movetime = movetime
+        self.startTime = time.perf_counter()
+        self.deadline = None if movetime is None else self.startTime + movetime
+        self.cancelled = threading.Event()  # set from another thread to stop the search
+        self.nodes = 0
+        self.depthReached = 0
+        self.score = None   # score of the best move at the deepest finished depth, from the side to move's view
+
+    def checkTime(self):
+        if self.cancelled.is_set() or (self.deadline is not None and time.perf_counter() >= self.deadline):
+            raise SearchTimeout()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def elapsed(self):
+        return time.perf_counter() - self.startTime
+
+
+"""
+Runs findBestMove on a copy of the game in a background thread so the game window keeps drawing and handling events
+while the AI thinks. The game loop calls done() each frame and collects the move with result()
+"""
+
+
+class BackgroundSearch():
+    def __init__(self, gs, depth=MAXDEPTH, tt=None, movetime=None, clock=None, increment=0, book=None,
+                 tablebases=None):
+        self.control = SearchController(movetime, clock, increment)
+        self.move = None
+        searchState = copy.deepcopy(gs)  # the search makes and undoes moves so it gets its own board
+        moves = searchState.getValidMoves()
+        self.thread = threading.Thread(target=self.search, args=(searchState, moves, depth, tt, book, tablebases),
+                                       daemon=True)
+        self.thread.start()
+
+    def search(self, gs, validMoves, depth, tt, book, tablebases):
+        self.move = findBestMove(gs, validMoves, depth, tt, self.control, book=book, tablebases=tablebases)
+
+    def done(self):
+        return not self.thread.is_alive()
+
+    def result(self):  # the move found (equal to the matching move in the real game's valid moves) or None
+        return self.move
+
+    def cancel(self):   # stops the search and waits for it, so it is no longer storing into a table the next one uses
+        self.control.cancel()
+        self.thread.join()
+
+
 """
 Scoring the board based on the material of each side
 """
@@ -50,3 +373,12 @@ def scoreMaterial(board):  # only scoring the material and not the position of t
             elif square[0] == "b":
                 score -= pieceScore[square[1]]   # negative number = winning for black
     return score
+
+
+"""
+Scoring the position on material and where the pieces stand, from the running totals the game state keeps
+"""
+
+
+def scoreBoard(gs):
+    return Evaluation.scorePosition(gs)
@@ -0,0 +1,108 @@
+"""
+Headless batch analysis. Reads positions (one FEN per line) from a file, searches each one with the AI on a pool of
+worker processes and writes one JSON object per position, in the same order as the input:
+
+    python Analyse.py positions.fen --depth 4 --workers 8 --output analysis.jsonl
+    python Analyse.py positions.fen --movetime 0.5
+
+Blank lines and lines starting with # are skipped. Each worker process is started once and keeps its own
+transposition table for all the positions it is given
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import AI
+import ChessEngine
+import TranspositionTable
+
+workerTable = None  # each worker process's transposition table, made once when the process starts
+workerSettings = {}
+
+
+def initWorker(depth, movetime, ttSizeMB):
+    global workerTable
+    workerTable = TranspositionTable.TranspositionTable(ttSizeMB)
+    workerSettings.update(depth=depth, movetime=movetime)
+
+
+"""
+Searches one position and returns its result record. Any error, from a bad FEN or from the search itself, is put in
+the record instead of being raised, so one broken position never stops the rest of the batch
+"""
+
+
+def analysePosition(fen):
+    result = {"fen": fen}
+    try:
+        gs = ChessEngine.GameState.from_fen(fen)
+    except (ValueError, IndexError, KeyError) as error:
+        result["error"] = "invalid FEN: %s" % error
+        return result
+    try:
+        searchPosition(gs, result)
+    except Exception as error:
+        result = {"fen": fen, "error": "analysis failed: %s: %s" % (type(error).__name__, error)}
+    return result
+
+
+def searchPosition(gs, result):
+    validMoves = gs.getValidMoves()
+    if len(validMoves) == 0:
+        result["bestmove"] = None
+        result["result"] = "checkmate" if gs.Checkmate else "stalemate"
+        return
+
+    control = AI.SearchController(workerSettings["movetime"])
+    move = AI.findBestMove(gs, validMoves, workerSettings["depth"], workerTable, control)
+    result["bestmove"] = move.ChessNotation()
+    result["score"] = control.score
+    result["depth"] = control.depthReached
+    result["nodes"] = control.nodes
+    result["time"] = round(control.elapsed(), 4)
+
+
+def readPositions(lines):  # yields the FENs as they are read so big files are never held in memory
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            yield line
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyse a file of FEN positions with the AI")
+    parser.add_argument("positions", help="file with one FEN per line ('-' reads standard input)")
+    parser.add_argument("--depth", type=int, help="search depth (default %d, or no limit with --movetime)" % AI.DEPTH)
+    parser.add_argument("--movetime", type=float, help="seconds to search each position for")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes (default: all cores)")
+    parser.add_argument("--tt", type=float, default=16, help="transposition table size in MB for each worker")
+    parser.add_argument("--chunksize", type=int, default=4, help="positions sent to a worker at a time")
+    parser.add_argument("--output", help="JSON lines file to write (default standard output)")
+    args = parser.parse_args()
+
+    depth = args.depth if args.depth is not None else (AI.MAXDEPTH if args.movetime else AI.DEPTH)
+    inputFile = sys.stdin if args.positions == "-" else open(args.positions)
+    outputFile = open(args.output, "w") if args.output else sys.stdout
+
+    start = time.perf_counter()
+    count = 0
+    with multiprocessing.Pool(args.workers, initWorker, (depth, args.movetime, args.tt)) as pool:
+        # imap hands out the positions lazily and gives the results back in the order they were read
+        for result in pool.imap(analysePosition, readPositions(inputFile), args.chunksize):
+            outputFile.write(json.dumps(result) + "\n")
+            count += 1
+    seconds = time.perf_counter() - start
+    print("analysed %d positions in %.2fs (%.1f positions/s) with %d workers" % (
+        count, seconds, count / seconds if seconds else 0.0, args.workers), file=sys.stderr)
+
+    if inputFile is not sys.stdin:
+        inputFile.close()
+    if outputFile is not sys.stdout:
+        outputFile.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Loading the piece images. The images folder is found next to this file so the game runs from any working directory.
+The twelve pieces are scaled once into a single strip (the atlas) for each square size and the strip is saved in
+images/cache, so later launches load one image instead of decoding and scaling twelve. Works with no window, for
+example with the SDL_VIDEODRIVER=dummy environment variable set
+"""
+import os
+
+import pygame as p
+
+imagesDirectory = os.path.join(os.path.dirname(os.path.abspath(__file__)), "images")
+cacheDirectory = os.path.join(imagesDirectory, "cache")
+pieces = ["wp", "wR", "wN", "wB", "wQ", "wK", "bp", "bR", "bN", "bB", "bQ", "bK"]  # order of the pieces in the atlas
+
+atlases = {}  # square size: (atlas, piece images), made once each run
+
+
+def atlasPath(squareSize, cache=cacheDirectory):
+    return os.path.join(cache, "pieces%d.png" % squareSize)
+
+
+"""
+Builds the atlas from the piece images: one row of squareSize squares, one for each piece in the order of pieces
+"""
+
+
+def buildAtlas(squareSize, directory=imagesDirectory):
+    atlas = p.Surface((squareSize * len(pieces), squareSize), p.SRCALPHA)
+    for i in range(len(pieces)):
+        image = p.image.load(os.path.join(directory, pieces[i] + ".png"))
+        atlas.blit(p.transform.smoothscale(image.convert_alpha() if p.display.get_surface() else image,
+                                           (squareSize, squareSize)), (i * squareSize, 0))
+    return atlas
+
+
+def isCacheCurrent(path, directory=imagesDirectory):  # the saved atlas is newer than every piece image
+    if not os.path.exists(path):
+        return False
+    saved = os.path.getmtime(path)
+    return all(os.path.getmtime(os.path.join(directory, piece + ".png")) <= saved for piece in pieces)
+
+
+"""
+Returns the piece images scaled to squareSize as a dictionary ("wp", "bK", ...), each a part of the shared atlas. The
+atlas is loaded from the disk cache when it is up to date, otherwise it is built and saved for the next launch
+"""
+
+
+def loadPieceImages(squareSize, directory=imagesDirectory, cache=cacheDirectory):
+    if squareSize not in atlases:
+        path = atlasPath(squareSize, cache)
+        if isCacheCurrent(path, directory):
+            atlas = p.image.load(path)
+        else:
+            atlas = buildAtlas(squareSize, directory)
+            try:
+                os.makedirs(cache, exist_ok=True)
+                p.image.save(atlas, path)
+            except (OSError, p.error):
+                pass  # a read only install still works, it just builds the atlas every launch
+        if p.display.get_surface() is not None:
+            atlas = atlas.convert_alpha()  # same pixel format as the window so blitting is fast
+        images = {pieces[i]: atlas.subsurface((i * squareSize, 0, squareSize, squareSize)) for i in range(len(pieces))}
+        atlases[squareSize] = (atlas, images)
+    return atlases[squareSize][1]
@@ -0,0 +1,135 @@
+"""
+Scores many positions at once with NumPy, for labelling positions in bulk or scoring a batch of search leaves. Each
+board is encoded as 64 int8 piece codes (0 for an empty square, then the pieces in the order of pieces below), so N
+positions are an (N, 64) array. (N, 12, 64) arrays of 0s and 1s, one plane per piece, are accepted as well.
+
+The scores are the same as Evaluation.scorePosition (material plus the piece square tables blended by phase, in pawns
+from white's side). Every square's material, middlegame, endgame and phase values are packed into one 64 bit number, so
+a batch is scored with one table lookup and one sum over the squares and no Python loop over the positions:
+
+    python BatchEvaluation.py positions.fen             scores a file of FENs (one a line)
+    python BatchEvaluation.py --benchmark 1000000       positions scored a second
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+
+import ChessEngine
+import Evaluation
+
+pieces = ["--", "wp", "wN", "wB", "wR", "wQ", "wK", "bp", "bN", "bB", "bR", "bQ", "bK"]  # index = piece code
+pieceCodes = {pieces[code]: code for code in range(len(pieces))}
+CHUNKSIZE = 65536  # positions scored at a time, so the gathered values of a huge batch never all need memory at once
+
+# (material, middlegame, endgame, phase) of every piece code on every square, at index code * 64 + square
+squareValues = np.array([(Evaluation.materialScore[piece], Evaluation.middlegameScore[piece][sq],
+                          Evaluation.endgameScore[piece][sq], Evaluation.phaseOfPiece[piece])
+                         for piece in pieces for sq in range(64)], dtype=np.int64)
+squareOffsets = np.arange(64, dtype=np.intp)
+
+# the four values packed 16 bits each into one number. Each value has FIELDBIAS added so it is never negative, and 64
+# squares of biased values (never more than 64 * (512 + 80)) still fit in 16 bits, so summing the packed numbers sums
+# each value separately
+FIELDBIAS = 512
+packedValues = sum((squareValues[:, field] + FIELDBIAS) << (16 * field) for field in range(4))
+
+# piece code of each two character piece name, looked up by the name's two bytes read as one 16 bit number
+codeOfName = np.zeros(65536, dtype=np.int8)
+for piece, code in pieceCodes.items():
+    codeOfName[np.frombuffer(piece.encode("ascii"), dtype=np.uint16)[0]] = code
+
+
+def encodeBoard(board):  # one 8x8 board as 64 piece codes
+    return encodeBoards([board])[0]
+
+
+"""
+Encodes many boards (8x8 lists such as GameState.board) into an (N, 64) int8 array. The boards are joined into one
+string of piece names and converted in a single lookup, which is much quicker than looking up each square in Python
+"""
+
+
+def encodeBoards(boards):
+    text = "".join(["".join(row) for board in boards for row in board]).encode("ascii")
+    return codeOfName[np.frombuffer(text, dtype=np.uint16)].reshape(-1, 64)
+
+
+def encodeGameStates(states):
+    return encodeBoards(gs.board for gs in states)
+
+
+def toPlanes(codes):  # (N, 64) piece codes into (N, 12, 64) planes, plane i marking the squares of pieces[i + 1]
+    return (codes[:, None, :] == np.arange(1, 13, dtype=np.int8)[None, :, None]).astype(np.int8)
+
+
+def fromPlanes(planes):
+    return (planes.astype(np.int8) * np.arange(1, 13, dtype=np.int8)[None, :, None]).sum(axis=1, dtype=np.int8)
+
+
+"""
+(material, middlegame, endgame, phase) totals for each position, the same numbers as Evaluation.boardTotals, as an
+(N, 4) int32 array
+"""
+
+
+def boardTotals(encoded):
+    codes = np.asarray(encoded)
+    if codes.ndim == 3:
+        codes = fromPlanes(codes)
+    totals = np.empty((len(codes), 4), dtype=np.int32)
+    for start in range(0, len(codes), CHUNKSIZE):
+        packed = np.take(packedValues, codes[start:start + CHUNKSIZE].astype(np.intp) * 64 + squareOffsets).sum(axis=1)
+        for field in range(4):
+            totals[start:start + CHUNKSIZE, field] = ((packed >> (16 * field)) & 0xFFFF) - 64 * FIELDBIAS
+    return totals
+
+
+def scoreMaterial(encoded):  # material only, in pawns from white's side, like AI.scoreMaterial
+    return boardTotals(encoded)[:, 0]
+
+
+def scorePositions(encoded):  # like Evaluation.scorePosition for each position, as a float64 array
+    totals = boardTotals(encoded)
+    phase = np.minimum(totals[:, 3], Evaluation.MAXPHASE)
+    positional = totals[:, 1] * phase + totals[:, 2] * (Evaluation.MAXPHASE - phase)
+    return totals[:, 0] + positional / (Evaluation.MAXPHASE * 100)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score FEN positions in one batch")
+    parser.add_argument("positions", nargs="?", help="file with one FEN per line ('-' reads standard input)")
+    parser.add_argument("--benchmark", type=int, metavar="N", help="time scoring N positions instead")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        states = [ChessEngine.GameState()]
+        for fen in ("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+                    "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+                    "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10"):
+            states.append(ChessEngine.GameState(fen))
+        start = time.perf_counter()
+        encoded = encodeGameStates(states[i % len(states)] for i in range(args.benchmark))
+        encodeSeconds = time.perf_counter() - start
+        start = time.perf_counter()
+        scores = scorePositions(encoded)
+        scoreSeconds = time.perf_counter() - start
+        for i in range(len(states)):
+            assert abs(scores[i] - Evaluation.scorePosition(states[i])) < 1e-9, "batch score differs from the game's"
+        print("encoded %d positions in %.2fs (%.0f a second), scored in %.3fs (%.0f a second)" % (
+            args.benchmark, encodeSeconds, args.benchmark / encodeSeconds, scoreSeconds,
+            args.benchmark / scoreSeconds))
+        return
+    if args.positions is None:
+        parser.error("a positions file or --benchmark is needed")
+
+    inputFile = sys.stdin if args.positions == "-" else open(args.positions)
+    fens = [line.strip() for line in inputFile if line.strip() and not line.startswith("#")]
+    scores = scorePositions(encodeGameStates(ChessEngine.GameState(fen) for fen in fens))
+    for fen, score in zip(fens, scores):
+        print("%s\t%.2f" % (fen, score))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,368 @@
+"""
+Bitboard version of the game state. Every piece type is stored as a 64 bit integer with one bit per square, so finding
+attacks and generating moves is a handful of integer operations instead of slicing the strings in the 8x8 board.
+Squares are numbered row * 8 + column, so square 0 is the top left corner (a8) just like board[0][0]
+"""
+from ChessEngine import GameState, Move, kingDirections, knightDirections, ALLMOVES, CAPTURES, \
+    QUIETS, WKS, WQS, BKS, BQS
+
+pieces = ["wp", "wN", "wB", "wR", "wQ", "wK", "bp", "bN", "bB", "bR", "bQ", "bK"]
+squareBits = [1 << sq for sq in range(64)]
+fullBoard = (1 << 64) - 1
+
+
+def jumpAttacks(sq, offsets):  # squares reached by a single jump for each of the offsets (knights and kings)
+    r, c = divmod(sq, 8)
+    attacks = 0
+    for dr, dc in offsets:
+        if 0 <= r + dr <= 7 and 0 <= c + dc <= 7:
+            attacks |= squareBits[(r + dr) * 8 + c + dc]
+    return attacks
+
+
+def rayFrom(sq, dr, dc):  # every square from sq to the edge of the board in one direction (not including sq)
+    r, c = divmod(sq, 8)
+    ray = 0
+    r += dr
+    c += dc
+    while 0 <= r <= 7 and 0 <= c <= 7:
+        ray |= squareBits[r * 8 + c]
+        r += dr
+        c += dc
+    return ray
+
+
+# attack tables are built once when the module is loaded
+knightAttacks = [jumpAttacks(sq, knightDirections) for sq in range(64)]
+kingAttacks = [jumpAttacks(sq, kingDirections) for sq in range(64)]
+pawnAttacks = {"w": [jumpAttacks(sq, ((-1, -1), (-1, 1))) for sq in range(64)],  # white pawns attack upwards
+               "b": [jumpAttacks(sq, ((1, -1), (1, 1))) for sq in range(64)]}
+rays = [[rayFrom(sq, dr, dc) for sq in range(64)] for dr, dc in kingDirections]  # same order as kingDirections
+rayIncreasing = [dr * 8 + dc > 0 for dr, dc in kingDirections]  # whether the squares along the ray go up in number
+rowMasks = {"w": (0xFF << 48, 0xFF << 32, 0xFF), "b": (0xFF << 8, 0xFF << 24, 0xFF << 56)}
+# (starting row, row after a two square push, promotion row) for the pawns of each colour
+
+
+def firstBlocker(j, blockers):  # the square of the closest piece along ray direction j
+    if rayIncreasing[j]:
+        return (blockers & -blockers).bit_length() - 1  # lowest bit
+    return blockers.bit_length() - 1  # highest bit
+
+
+def slidingAttacks(sq, occupied, directions):
+    attacks = 0
+    for j in directions:
+        ray = rays[j][sq]
+        blockers = ray & occupied
+        if blockers:
+            ray ^= rays[j][firstBlocker(j, blockers)]  # cuts the ray off behind the first piece in the way
+        attacks |= ray
+    return attacks
+
+
+rookDirections = (0, 1, 2, 3)
+bishopDirections = (4, 5, 6, 7)
+
+
+class BitboardGameState(GameState):
+    # twelve bitboards (one for each piece) plus the occupancy of each colour. The 8x8 board of strings is only built
+    # when something asks for it (mainly drawing the pieces)
+    def __init__(self, fen=None):
+        self.bitboards = {}
+        self.occupancy = {}
+        self.squares = []  # the piece on each of the 64 squares for quick look ups when making moves
+        self.boardView = None
+        super().__init__(fen)
+
+    """
+    The 8x8 list board, built lazily from the bitboards and kept until the next move changes it
+    """
+    @property
+    def board(self):
+        if self.boardView is None:
+            self.boardView = [self.squares[r * 8:r * 8 + 8] for r in range(8)]
+        return self.boardView
+
+    @board.setter
+    def board(self, board):  # setting up a position from an 8x8 list board
+        self.bitboards = {piece: 0 for piece in pieces}
+        self.squares = []
+        for r in range(8):
+            for c in range(8):
+                piece = board[r][c]
+                self.squares.append(piece)
+                if piece != "--":
+                    self.bitboards[piece] |= squareBits[r * 8 + c]
+        self.occupancy = {colour: self.colourOccupancy(colour) for colour in "wb"}
+        self.boardView = None
+
+    def colourOccupancy(self, colour):
+        occupied = 0
+        for piece in pieces:
+            if piece[0] == colour:
+                occupied |= self.bitboards[piece]
+        return occupied
+
+    def putPiece(self, piece, sq):
+        self.bitboards[piece] |= squareBits[sq]
+        self.occupancy[piece[0]] |= squareBits[sq]
+        self.squares[sq] = piece
+
+    def removePiece(self, piece, sq):  # clears the bit rather than toggling it, so removing twice can never add a piece
+        self.bitboards[piece] &= ~squareBits[sq]
+        self.occupancy[piece[0]] &= ~squareBits[sq]
+        self.squares[sq] = "--"
+
+    def movePieces(self, move):
+        start = move.startRow * 8 + move.startColumn
+        end = move.endRow * 8 + move.endColumn
+        self.removePiece(move.pieceMoved, start)
+        if move.isenPassantMove:
+            self.removePiece(move.pieceCaptured, move.startRow * 8 + move.endColumn)  # pawn is beside the start square
+        elif move.pieceCaptured != "--":
+            self.removePiece(move.pieceCaptured, end)
+        if move.isPawnPromotion:
+            self.putPiece(move.pieceMoved[0] + "Q", end)  # pawns always promote to a queen
+        else:
+            self.putPiece(move.pieceMoved, end)
+
+        if move.isCastleMove:
+            rook = move.pieceMoved[0] + "R"
+            if move.endColumn - move.startColumn == 2:  # king side castle
+                self.removePiece(rook, end + 1)
+                self.putPiece(rook, end - 1)
+            else:   # queen side castle
+                self.removePiece(rook, end - 2)
+                self.putPiece(rook, end + 1)
+        self.boardView = None
+
+    def unmovePieces(self, move):
+        start = move.startRow * 8 + move.startColumn
+        end = move.endRow * 8 + move.endColumn
+        self.removePiece(move.pieceMoved[0] + "Q" if move.isPawnPromotion else move.pieceMoved, end)
+        self.putPiece(move.pieceMoved, start)
+        if move.isenPassantMove:
+            self.putPiece(move.pieceCaptured, move.startRow * 8 + move.endColumn)
+        elif move.pieceCaptured != "--":
+            self.putPiece(move.pieceCaptured, end)
+
+        if move.isCastleMove:
+            rook = move.pieceMoved[0] + "R"
+            if move.endColumn - move.startColumn == 2:  # king side castle
+                self.removePiece(rook, end - 1)
+                self.putPiece(rook, end + 1)
+            else:   # queen side castle
+                self.removePiece(rook, end + 1)
+                self.putPiece(rook, end - 2)
+        self.boardView = None
+
+    """
+    Bitboard of every piece of the given colour attacking the square sq when the board has the given occupancy
+    """
+    def attackersTo(self, sq, colour, occupied):
+        bitboards = self.bitboards
+        enemy = "b" if colour == "w" else "w"
+        attackers = pawnAttacks[enemy][sq] & bitboards[colour + "p"]  # a pawn attacks sq from where sq's pawn would
+        attackers |= knightAttacks[sq] & bitboards[colour + "N"]
+        attackers |= kingAttacks[sq] & bitboards[colour + "K"]
+        queens = bitboards[colour + "Q"]
+        attackers |= slidingAttacks(sq, occupied, rookDirections) & (bitboards[colour + "R"] | queens)
+        attackers |= slidingAttacks(sq, occupied, bishopDirections) & (bitboards[colour + "B"] | queens)
+        return attackers
+
+    def isSquareAttacked(self, r, c, colour):
+        return self.attackersTo(r * 8 + c, colour, self.occupancy["w"] | self.occupancy["b"]) != 0
+
+    def getAllPossibleMoves(self):  # All possible moves not considering checks (some may be invalid)
+        return self.generateMoves(False)
+
+    def getValidMoves(self):    # All moves considering checks (valid moves)
+        moves = self.generateMoves(True)
+        if len(moves) == 0:  # stalemate or checkmate situation
+            if self.inCheck():
+                self.Checkmate = True
+            else:
+                self.Stalemate = True
+        else:
+            self.Checkmate = False
+            self.Stalemate = False
+        return moves
+
+    def getCaptureMoves(self):  # valid captures and promotions only, without making any of the quiet moves
+        return self.generateMoves(True, CAPTURES)
+
+    def getQuietMoves(self):
+        return self.generateMoves(True, QUIETS)
+
+    def getPieceMoves(self, r, c):
+        return self.generateMoves(True, ALLMOVES, squareBits[r * 8 + c])
+
+    """
+    Generates the moves for the player to move. When legal is True the pins and checks on the king are worked out
+    first and only legal moves are made (including castling), otherwise every pseudo legal move is returned. kind
+    is ALLMOVES, CAPTURES (captures, en passant and pawn promotions) or QUIETS (the rest), and only pieces standing on
+    a square in fromMask are moved
+    """
+    def generateMoves(self, legal, kind=ALLMOVES, fromMask=fullBoard):
+        if self.whitetomove:
+            colour, enemy = "w", "b"
+        else:
+            colour, enemy = "b", "w"
+        bitboards = self.bitboards
+        squares = self.squares
+        own = self.occupancy[colour]
+        occupied = own | self.occupancy[enemy]
+        kingSq = bitboards[colour + "K"].bit_length() - 1
+        targets = fullBoard ^ own  # squares pieces other than the king are allowed to move to
+        kindMask = fullBoard  # squares the kind of move asked for can land on (pawn pushes are handled separately)
+        pushMask = fullBoard
+        if kind == CAPTURES:
+            kindMask = self.occupancy[enemy]
+            pushMask = rowMasks[colour][2]
+        elif kind == QUIETS:
+            kindMask = fullBoard ^ occupied
+            pushMask = fullBoard ^ rowMasks[colour][2]
+        pinned = {}  # pinned square: squares that piece may still move to
+        checkers = 0
+        moves = []
+
+        if legal:
+            checkers = self.attackersTo(kingSq, enemy, occupied)
+            for j in range(8):  # looks along each line from the king for one of our pieces with an enemy slider behind
+                blockers = rays[j][kingSq] & occupied
+                if not blockers:
+                    continue
+                first = firstBlocker(j, blockers)
+                if not own & squareBits[first]:
+                    continue
+                blockers &= rays[j][first]
+                if not blockers:
+                    continue
+                second = firstBlocker(j, blockers)
+                sliders = bitboards[enemy + "Q"] | bitboards[enemy + ("R" if j < 4 else "B")]
+                if sliders & squareBits[second]:
+                    pinned[first] = rays[j][kingSq] ^ rays[j][second]  # the line up to and including the pinner
+
+            if checkers & (checkers - 1):  # double check so only the king is able to move
+                targets = 0
+            elif checkers:
+                checkerSq = checkers.bit_length() - 1
+                targets = checkers
+                for j in range(8):  # sliding checks can also be blocked
+                    if rays[j][kingSq] & checkers and squares[checkerSq][1] in "RBQ":
+                        targets |= rays[j][kingSq] ^ rays[j][checkerSq]
+                        break
+
+        if targets:
+            self.getPawnBitboardMoves(colour, enemy, own, occupied, targets, pinned, kingSq, legal, moves, pushMask,
+                                      kind != QUIETS, fromMask)
+            for pieceType in "NBRQ":
+                piece = colour + pieceType
+                pieceSquares = bitboards[piece] & fromMask
+                while pieceSquares:
+                    low = pieceSquares & -pieceSquares
+                    pieceSquares ^= low
+                    start = low.bit_length() - 1
+                    if pieceType == "N":
+                        attacks = knightAttacks[start]
+                    elif pieceType == "B":
+                        attacks = slidingAttacks(start, occupied, bishopDirections)
+                    elif pieceType == "R":
+                        attacks = slidingAttacks(start, occupied, rookDirections)
+                    else:
+                        attacks = slidingAttacks(start, occupied, range(8))
+                    attacks &= targets & kindMask
+                    if start in pinned:
+                        attacks &= pinned[start]
+                    self.addMoves(start, attacks, piece, moves)
+
+        if not squareBits[kingSq] & fromMask:
+            return moves
+
+        # king moves
+        attacks = kingAttacks[kingSq] & ~own & kindMask
+        if legal:
+            withoutKing = occupied ^ squareBits[kingSq]  # the king can not hide behind itself
+            safe = 0
+            while attacks:
+                low = attacks & -attacks
+                attacks ^= low
+                if not self.attackersTo(low.bit_length() - 1, enemy, withoutKing):
+                    safe |= low
+            attacks = safe
+        self.addMoves(kingSq, attacks, colour + "K", moves)
+
+        if legal and not checkers and kind != CAPTURES:
+            self.getCastleBitboardMoves(colour, enemy, kingSq, occupied, moves)
+        return moves
+
+    def addMoves(self, start, targets, piece, moves):
+        squares = self.squares
+        startsq = divmod(start, 8)
+        while targets:
+            low = targets & -targets
+            targets ^= low
+            end = low.bit_length() - 1
+            moves.append(Move(startsq, divmod(end, 8), None, pieceMoved=piece, pieceCaptured=squares[end]))
+
+    def getPawnBitboardMoves(self, colour, enemy, own, occupied, targets, pinned, kingSq, legal, moves,
+                             pushMask=fullBoard, withCaptures=True, fromMask=fullBoard):
+        # pushMask: squares pawn pushes may land on, withCaptures: whether captures and en passant are made
+        pawn = colour + "p"
+        forward = -8 if colour == "w" else 8
+        startRow = rowMasks[colour][0]
+        squares = self.squares
+        enemyPieces = self.occupancy[enemy]
+        epSquare = -1
+        if self.enPassantPossible != ():
+            epSquare = self.enPassantPossible[0] * 8 + self.enPassantPossible[1]
+        if not withCaptures:
+            enemyPieces = 0
+            epSquare = -1
+
+        pawnSquares = self.bitboards[pawn] & fromMask
+        while pawnSquares:
+            low = pawnSquares & -pawnSquares
+            pawnSquares ^= low
+            start = low.bit_length() - 1
+            allowed = targets & pinned.get(start, fullBoard)
+            startsq = divmod(start, 8)
+
+            one = start + forward
+            if not occupied & squareBits[one]:  # 1 square up move
+                if allowed & pushMask & squareBits[one]:
+                    moves.append(Move(startsq, divmod(one, 8), None, pieceMoved=pawn, pieceCaptured="--"))
+                two = one + forward
+                if low & startRow and not occupied & squareBits[two] and allowed & pushMask & squareBits[two]:
+                    moves.append(Move(startsq, divmod(two, 8), None, pieceMoved=pawn, pieceCaptured="--"))
+
+            attacks = pawnAttacks[colour][start]
+            captures = attacks & enemyPieces & allowed
+            while captures:
+                captureLow = captures & -captures
+                captures ^= captureLow
+                end = captureLow.bit_length() - 1
+                moves.append(Move(startsq, divmod(end, 8), None, pieceMoved=pawn, pieceCaptured=squares[end]))
+
+            if epSquare >= 0 and attacks & squareBits[epSquare]:
+                capturedSq = startsq[0] * 8 + epSquare % 8
+                if legal:
+                    # two pawns leave the same row so the king is checked with the capture played out
+                    afterCapture = occupied ^ low ^ squareBits[epSquare] ^ squareBits[capturedSq]
+                    if self.attackersTo(kingSq, enemy, afterCapture) & ~squareBits[capturedSq]:
+                        continue
+                moves.append(Move(startsq, divmod(epSquare, 8), None, isEnpassantMove=True, pieceMoved=pawn,
+                                  pieceCaptured=enemy + "p"))
+
+    def getCastleBitboardMoves(self, colour, enemy, kingSq, occupied, moves):
+        rights = self.castlingRights
+        kingSide, queenSide = (rights & WKS, rights & WQS) if colour == "w" else (rights & BKS, rights & BQS)
+        kingsq = divmod(kingSq, 8)
+        if kingSide and not occupied & (squareBits[kingSq + 1] | squareBits[kingSq + 2]):
+            if not self.attackersTo(kingSq + 1, enemy, occupied) and not self.attackersTo(kingSq + 2, enemy, occupied):
+                moves.append(Move(kingsq, divmod(kingSq + 2, 8), None, isCastleMove=True, pieceMoved=colour + "K",
+                                  pieceCaptured="--"))
+        if queenSide and not occupied & (squareBits[kingSq - 1] | squareBits[kingSq - 2] | squareBits[kingSq - 3]):
+            if not self.attackersTo(kingSq - 1, enemy, occupied) and not self.attackersTo(kingSq - 2, enemy, occupied):
+                moves.append(Move(kingsq, divmod(kingSq - 2, 8), None, isCastleMove=True, pieceMoved=colour + "K",
+                                  pieceCaptured="--"))
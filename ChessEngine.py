@@ -2,10 +2,52 @@
 Storing the information of the current state of the chess game. Also responsible for checking valid moves.
 While also storing a move log for players
 """
+import random
+import Evaluation
+
+kingDirections = ((-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))  # rook directions then bishop
+knightDirections = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
+attackingPieces = {colour: tuple(colour + piece for piece in "pNBRQK") for colour in "wb"}  # pieces of each colour
+
+fenPieces = {symbol: ("w" if symbol.isupper() else "b") + (symbol.upper() if symbol.lower() != "p" else "p")
+             for symbol in "KQRBNPkqrbnp"}  # FEN letters to the board's two character pieces
+fenSymbols = {piece: symbol for symbol, piece in fenPieces.items()}
+emptySquares = [["--"] * count for count in range(9)]
+
+ALLMOVES = 0  # kinds of moves the move generators can be asked for
+CAPTURES = 1  # captures and pawn promotions only
+QUIETS = 2    # every other move (including castling)
+
+WKS = 1  # castling rights as bits of one number (white king side, white queen side, black king side, black queen side)
+WQS = 2
+BKS = 4
+BQS = 8
+ALLRIGHTS = WKS | WQS | BKS | BQS
+# rights still left after a move from or to each square: moving the king or a rook, or capturing a rook, loses them
+castlingMasks = [ALLRIGHTS] * 64
+castlingMasks[0] = ALLRIGHTS & ~BQS
+castlingMasks[4] = ALLRIGHTS & ~(BKS | BQS)
+castlingMasks[7] = ALLRIGHTS & ~BKS
+castlingMasks[56] = ALLRIGHTS & ~WQS
+castlingMasks[60] = ALLRIGHTS & ~(WKS | WQS)
+castlingMasks[63] = ALLRIGHTS & ~WKS
+
+# Zobrist keys: a random 64 bit number for every piece on every square, black to move, each of the 16 combinations of
+# castling rights and each file an en passant can happen on. A position's key is all of its numbers XORed together.
+# Fixed seed so the keys are the same every run (saved books and other processes rely on this)
+zobristRandom = random.Random(20201)
+zobristPieces = {colour + piece: [zobristRandom.getrandbits(64) for sq in range(64)]
+                 for colour in "wb" for piece in "pNBRQK"}
+zobristPieces["--"] = [0] * 64  # empty squares add nothing
+zobristBlackToMove = zobristRandom.getrandbits(64)
+zobristCastling = [zobristRandom.getrandbits(64) for rights in range(16)]
+zobristEnPassant = [zobristRandom.getrandbits(64) for column in range(8)]
+
+
 class GameState():
     # bored is an 8x8 dimensional list (first character represents colour of piece and the second represents the type)
     # "--" means that no current piece is holding this position
-    def __init__(self):
+    def __init__(self, fen=None):  # starts from the normal starting position unless a FEN string is given
         self.board = [
             ["bR", "bN", "bB", "bQ", "bK", "bB", "bN", "bR"],
             ["bp", "bp", "bp", "bp", "bp", "bp", "bp", "bp"],
@@ -29,54 +71,227 @@ class GameState():
 
         self.enPassantPossible = ()  # coordinates for the square when an en passant is possible
 
-        self.currentCastlingRights = CastleRights(True, True, True, True)  # able to castle any side at the start of the game
+        self.castlingRights = ALLRIGHTS  # able to castle any side at the start of the game
         # does not mean that castling is valid move, just if they have the right to castle when possible
-        self.castleRightsLog = [CastleRights(self.currentCastlingRights.wks, self.currentCastlingRights.bks,
-                                             self.currentCastlingRights.wqs, self.currentCastlingRights.bqs)]
-        # helps with modifying the list of the castling rights since we will know when it happends
+
+        self.halfmoveClock = 0  # moves since the last capture or pawn move
+        self.fullmoveNumber = 1  # goes up by one after each of black's moves
+
+        if fen is not None:
+            self.loadFen(fen)   # replaces the starting position
+        else:
+            self.resetState()
+
+    """
+    Starts the logs, key and evaluation totals again from the position on the board, as if the game started here
+    """
+    def resetState(self):
+        self.movelog = []
+        self.Checkmate = False
+        self.Stalemate = False
+
+        # what a move changes that can not be worked out again from the move when it is undone: one tuple of
+        # (castling rights, en passant square, halfmove clock, key) from before each move
+        self.stateLog = []
+
+        self.zobristKey = self.computeZobristKey()  # 64 bit key for the position, updated with every move
+        self.positionCounts = {self.zobristKey: 1}  # how many times each position has been reached in the game
+
+        # running totals for the evaluation (material in pawns, square bonuses for the middlegame and endgame, and
+        # how much of the middlegame material is left), kept up to date by every move
+        self.material, self.middlegameScore, self.endgameScore, self.phase = Evaluation.boardTotals(self.board)
+
+    """
+    The castling rights as a CastleRights (made fresh each time, so changing it does not change the game state). Kept
+    for code that reads the rights by name
+    """
+    @property
+    def currentCastlingRights(self):
+        rights = self.castlingRights
+        return CastleRights(bool(rights & WKS), bool(rights & BKS), bool(rights & WQS), bool(rights & BQS))
+
+    @currentCastlingRights.setter
+    def currentCastlingRights(self, rights):
+        self.castlingRights = castleRightsIndex(rights)
+
+    """
+    Builds a game state from a FEN string (piece placement, side to move, castling rights, en passant square and the
+    halfmove and fullmove counters)
+    """
+    @classmethod
+    def from_fen(cls, fen):
+        return cls(fen)
+
+    """
+    Sets up the position from a FEN string, starting the game again from it (the move log and the repetition counts
+    are cleared). Raises ValueError, leaving the game state as it was, for a FEN that does not describe a board of 8
+    ranks of 8 squares with one king of each colour and no pawns on the first or last rank, that is missing the side to
+    move, has an en passant square no pawn could have just passed or leaves the side that is not to move in check.
+    Castling rights for a king or rook that is not on its starting square are dropped
+    """
+    def loadFen(self, fen):
+        fields = fen.split()
+        if len(fields) < 2:
+            raise ValueError("FEN %r needs at least the piece placement and the side to move" % fen)
+        ranks = fields[0].split("/")
+        if len(ranks) != 8:
+            raise ValueError("FEN %r has %d ranks instead of 8" % (fen, len(ranks)))
+        board = []
+        for rank in ranks:
+            row = []
+            for symbol in rank:
+                if symbol in fenPieces:
+                    row.append(fenPieces[symbol])
+                elif symbol in "12345678":
+                    row.extend(emptySquares[int(symbol)])
+                else:
+                    raise ValueError("FEN %r has an unknown piece %r" % (fen, symbol))
+            if len(row) != 8:
+                raise ValueError("FEN %r has a rank %r of %d squares instead of 8" % (fen, rank, len(row)))
+            board.append(row)
+        for king in ("wK", "bK"):
+            count = sum(row.count(king) for row in board)
+            if count != 1:
+                raise ValueError("FEN %r has %d %s kings instead of 1" % (fen, count,
+                                                                          "white" if king == "wK" else "black"))
+        if any(square[1] == "p" for square in board[0] + board[7]):
+            raise ValueError("FEN %r has a pawn on the first or last rank" % fen)
+        if fields[1] not in ("w", "b"):
+            raise ValueError("FEN %r has side to move %r instead of w or b" % (fen, fields[1]))
+        whitetomove = fields[1] == "w"
+
+        castling = fields[2] if len(fields) > 2 else "-"
+        if castling != "-" and (not castling or any(symbol not in "KQkq" for symbol in castling)):
+            raise ValueError("FEN %r has castling rights %r" % (fen, castling))
+        rights = ("K" in castling and WKS) | ("Q" in castling and WQS) | ("k" in castling and BKS) | \
+                 ("q" in castling and BQS)
+        for right, row, rookColumn in ((WKS, 7, 7), (WQS, 7, 0), (BKS, 0, 7), (BQS, 0, 0)):
+            colour = "w" if row == 7 else "b"
+            if board[row][4] != colour + "K" or board[row][rookColumn] != colour + "R":
+                rights &= ~right    # the king or the rook has moved, so that side can not castle any more
+
+        enPassant = fields[3] if len(fields) > 3 else "-"
+        enPassantPossible = ()
+        if enPassant != "-":
+            if len(enPassant) != 2 or enPassant[0] not in Move.LetterDictionary or \
+                    enPassant[1] != ("6" if whitetomove else "3"):
+                raise ValueError("FEN %r has en passant square %r" % (fen, enPassant))
+            enPassantPossible = (Move.NumberDictionary[enPassant[1]], Move.LetterDictionary[enPassant[0]])
+            pawnRow = enPassantPossible[0] + (1 if whitetomove else -1)   # where the pawn that moved two squares is
+            if board[pawnRow][enPassantPossible[1]] != ("b" if whitetomove else "w") + "p":
+                raise ValueError("FEN %r has en passant square %r with no pawn in front of it" % (fen, enPassant))
+
+        try:
+            halfmoveClock = int(fields[4]) if len(fields) > 4 else 0
+            fullmoveNumber = int(fields[5]) if len(fields) > 5 else 1
+        except ValueError:
+            raise ValueError("FEN %r has move counters that are not numbers" % fen) from None
+
+        saved = dict(self.__dict__)  # put back if the position turns out to be impossible
+        self.board = board
+        for r in range(8):
+            if "wK" in board[r]:
+                self.whiteKingLocation = (r, board[r].index("wK"))
+            if "bK" in board[r]:
+                self.blackKingLocation = (r, board[r].index("bK"))
+        self.whitetomove = whitetomove
+        self.castlingRights = rights
+        self.enPassantPossible = enPassantPossible
+        self.halfmoveClock = halfmoveClock
+        self.fullmoveNumber = fullmoveNumber
+
+        otherKing = self.blackKingLocation if whitetomove else self.whiteKingLocation
+        if self.isSquareAttacked(otherKing[0], otherKing[1], "w" if whitetomove else "b"):
+            self.__dict__.clear()
+            self.__dict__.update(saved)
+            raise ValueError("FEN %r leaves the side that is not to move in check" % fen)
+        self.resetState()
+
+    def to_fen(self):
+        ranks = []
+        for row in self.board:
+            rank = ""
+            empty = 0
+            for square in row:
+                if square == "--":
+                    empty += 1
+                else:
+                    if empty:
+                        rank += str(empty)
+                        empty = 0
+                    rank += fenSymbols[square]
+            if empty:
+                rank += str(empty)
+            ranks.append(rank)
+        rights = self.castlingRights
+        castling = ("K" if rights & WKS else "") + ("Q" if rights & WQS else "") + ("k" if rights & BKS else "") + \
+                   ("q" if rights & BQS else "")
+        if self.enPassantPossible != ():
+            enPassant = Move.columnstoFiles[self.enPassantPossible[1]] + Move.rowsintoRanks[self.enPassantPossible[0]]
+        else:
+            enPassant = "-"
+        return "%s %s %s %s %d %d" % ("/".join(ranks), "w" if self.whitetomove else "b", castling or "-", enPassant,
+                                      self.halfmoveClock, self.fullmoveNumber)
 
     """
-    Takes a move then executes it however it does not work for castling, en-passant and pawn promotion"""
+    Takes a move then executes it, including castling, en-passant and pawn promotion"""
     def makeMove(self, move):
-        self.board[move.startRow][move.startColumn] = "--"
-        # when moving a piece the location of that piece after it is moved will always be blank
-        self.board[move.endRow][move.endColumn] = move.pieceMoved
-        # moves selected piece into selected location
+        oldEnPassant = self.enPassantPossible
+        oldCastleRights = self.castlingRights
+        self.stateLog.append((oldCastleRights, oldEnPassant, self.halfmoveClock, self.zobristKey))
+        self.movePieces(move)  # moves the pieces on the board
         self.movelog.append(move)  # logs the move which can be edited later
         self.whitetomove = not self.whitetomove  # changes players turn since the turn is done
 
+        if move.pieceMoved[1] == "p" or move.pieceCaptured != "--":
+            self.halfmoveClock = 0
+        else:
+            self.halfmoveClock += 1
+        if self.whitetomove:    # black has just moved
+            self.fullmoveNumber += 1
+
         if move.pieceMoved == "wK":
             self.whiteKingLocation = (move.endRow, move.endColumn)  # updates the kings location on the board
         elif move.pieceMoved == "bK":
             self.blackKingLocation = (move.endRow, move.endColumn)
 
-        #pawn promotion
-        if move.isPawnPromotion:
-            self.board[move.endRow][move.endColumn] = move.pieceMoved[0] + "Q"  # changes the piece to a queen
-
-        #enpassant
-        if move.isenPassantMove:
-            self.board[move.startRow][move.endColumn] = "--"  # capturing the pawn instead of just moving to blank space
-
         if move.pieceMoved[1] == "p" and abs(move.startRow - move.endRow) == 2: # helps for black and white pawns
             self.enPassantPossible = ((move.startRow + move.endRow)//2, move.startColumn) # average between squares
         else:
             self.enPassantPossible = ()
 
-        # castling
-        if move.isCastleMove:
-            if move.endColumn - move.startColumn == 2:  # this is a king side castle
-                self.board[move.endRow][move.endColumn-1] = self.board[move.endRow][move.endColumn+1] # "new" rook being placed
-                self.board[move.endRow][move.endColumn+1] = "--"  # deletes old rook
-            else:   # queen side castle
-                self.board[move.endRow][move.endColumn+1] = self.board[move.endRow][move.endColumn-2] # moves the rook
-                self.board[move.endRow][move.endColumn - 2] = "--"  # deletes old rook
+        # update castling rights - whether a king or a rook moves, or a rook is captured
+        start = move.startRow * 8 + move.startColumn
+        end = move.endRow * 8 + move.endColumn
+        self.castlingRights = oldCastleRights & castlingMasks[start] & castlingMasks[end]
 
-        # update castling rights - whether a king or a rook moves
-        self.updateCastleRights(move)
-        self.castleRightsLog.append(CastleRights(self.currentCastlingRights.wks, self.currentCastlingRights.bks,
-                                             self.currentCastlingRights.wqs, self.currentCastlingRights.bqs))
-        # adds the castle rights to rights log
+        # update the key with only what the move changed
+        key = self.zobristKey ^ zobristBlackToMove
+        key ^= zobristPieces[move.pieceMoved][start]
+        if move.isenPassantMove:
+            key ^= zobristPieces[move.pieceCaptured][move.startRow * 8 + move.endColumn]
+        else:
+            key ^= zobristPieces[move.pieceCaptured][end]
+        key ^= zobristPieces[move.pieceMoved[0] + "Q" if move.isPawnPromotion else move.pieceMoved][end]
+        if move.isCastleMove:
+            rook = zobristPieces[move.pieceMoved[0] + "R"]
+            if move.endColumn - move.startColumn == 2:  # king side rook jumps from the corner to the left of the king
+                key ^= rook[end + 1] ^ rook[end - 1]
+            else:
+                key ^= rook[end - 2] ^ rook[end + 1]
+        if oldEnPassant != ():
+            key ^= zobristEnPassant[oldEnPassant[1]]
+        if self.enPassantPossible != ():
+            key ^= zobristEnPassant[self.enPassantPossible[1]]
+        key ^= zobristCastling[oldCastleRights] ^ zobristCastling[self.castlingRights]
+        self.zobristKey = key
+        self.positionCounts[key] = self.positionCounts.get(key, 0) + 1
+
+        material, middlegame, endgame, phase = Evaluation.moveTotals(move)
+        self.material += material
+        self.middlegameScore += middlegame
+        self.endgameScore += endgame
+        self.phase += phase
 
     """
     This will undo the last move so beginners can learn from mistakes and go back
@@ -84,96 +299,276 @@ class GameState():
     def undoMove(self):
         if len(self.movelog) != 0:  # makes sure that there is a move which can be undone
             move = self.movelog.pop()   # removes it from the move log list
-            self.board[move.startRow][move.startColumn] = move.pieceMoved   # opposite of line 26 since it reverses it
-            self.board[move.endRow][move.endColumn] = move.pieceCaptured    # captured piece places back on the board
+            self.unmovePieces(move)     # puts the pieces back where they were on the board
             self.whitetomove = not self.whitetomove     # change moves back
 
+            if not self.whitetomove:    # undoing one of black's moves
+                self.fullmoveNumber -= 1
+
             if move.pieceMoved == "wK":
                 self.whiteKingLocation = (move.startRow, move.startColumn)
             if move.pieceMoved == "bK":
                 self.blackKingLocation = (move.startRow, move.startColumn)
 
-            # undo enpassant move
-            if move.isenPassantMove:
-                self.board[move.endRow][move.endColumn] = "--"  # the piece captured is not where it would be placed
-                self.board[move.startRow][move.endColumn] = move.pieceCaptured
-                self.enPassantPossible = (move.endRow, move.endColumn)  # makes sure you can redo the enpassant
-
-            # undo two square pawn advance
-            if move.pieceMoved[1] == "p" and abs(move.startRow - move.endRow) == 2:
-                    self.enPassantPossible = ()
-
-            # undo castling (rights)
-            self.castleRightsLog.pop()  # pops the castle rights of the last move
-            self.currentCastlingRights = self.castleRightsLog[-1]  # sets them back to how they were before
-
-            if move.isCastleMove:
-                if move.endColumn - move.startColumn == 2:  # kingside castle
-                    self.board[move.endRow][move.endColumn+1] = self.board[move.endRow][move.endColumn-1]
-                    self.board[move.endRow][move.endColumn - 1] = "--"  # reversing the castling
-                else:   # queenside castling
-                    self.board[move.endRow][move.endColumn-2] = self.board[move.endRow][move.endColumn+1]
-                    self.board[move.endRow][move.endColumn + 1] = "--"
-
-    """         
-    Update the castle rights given the move which has just been played
-    """
-    def updateCastleRights(self, move):
-        if move.pieceMoved == "wK": # if king is moved it loses both king side and queen side castling
-            self.currentCastlingRights.wks = False
-            self.currentCastlingRights.wqs = False
-        elif move.pieceMoved == "bK":
-            self.currentCastlingRights.bks = False
-            self.currentCastlingRights.bqs = False
-        elif move.pieceMoved == "wR":
-            if move.startRow == 7:  # white pieces row
-                if move.startColumn == 0:  # queen side rook (left rook)
-                    self.currentCastlingRights.wqs = False
-                elif move.startColumn == 7:  # king side rook (right rook)
-                    self.currentCastlingRights.wks = False
-            elif move.startRow == 7:
-                if move.startColumn == 0:  # queen side rook (left rook)
-                    self.currentCastlingRights.bqs = False
-                elif move.startColumn == 7:  # king side rook (right rook)
-                    self.currentCastlingRights.bks = False
+            count = self.positionCounts[self.zobristKey] - 1
+            if count:
+                self.positionCounts[self.zobristKey] = count
+            else:
+                del self.positionCounts[self.zobristKey]
 
-    def getValidMoves(self):    # All moves considering checks (valid moves)
-        tempEnpassantPossible = self.enPassantPossible
-        tempCastleRights = CastleRights(self.currentCastlingRights.wks, self.currentCastlingRights.bks,
-                                             self.currentCastlingRights.wqs, self.currentCastlingRights.bqs)
-        # generate all possible moves
-        moves = self.getAllPossibleMoves()
+            # castling rights, en passant square (including after a two square advance), clock and key from before
+            self.castlingRights, self.enPassantPossible, self.halfmoveClock, self.zobristKey = self.stateLog.pop()
 
-        if self.whitetomove:
-            self.getCastleMoves(self.whiteKingLocation[0], self.whiteKingLocation[1], moves)
-        else:
-            self.getCastleMoves(self.blackKingLocation[0], self.blackKingLocation[1], moves)
+            material, middlegame, endgame, phase = Evaluation.moveTotals(move)
+            self.material -= material
+            self.middlegameScore -= middlegame
+            self.endgameScore -= endgame
+            self.phase -= phase
 
-        # makes each move which is possible
-        for i in range(len(moves) -1, -1, -1):  # when removing from a list: start at the back to help with indexing
-            self.makeMove(moves[i])
+    """
+    Draws by the rules rather than by the position: the same position (same player to move, castling rights and en
+    passant square) reached for the third time, or 50 moves by each player without a capture or a pawn move. Returns
+    the reason or None. Checkmate on the last of the 50 moves still wins so that is checked by the caller first
+    """
+    def drawByRule(self):
+        if self.positionCounts[self.zobristKey] >= 3:
+            return "threefold repetition"
+        if self.halfmoveClock >= 100:
+            return "fifty-move rule"
+        return None
 
-            # generate all of opponents moves
+    def isRepetition(self):  # the position has been reached before in the game (or earlier in a search)
+        return self.positionCounts[self.zobristKey] > 1
 
-            # see if any opponents moves attack the king
-            self.whitetomove = not self.whitetomove
-            if self.inCheck():
-                moves.remove(moves[i])  # if they do attack the king, it is not a valid move
-            self.whitetomove = not self.whitetomove
-            self.undoMove()  # make sure it does not physically moves piece on the board
+    """
+    Moves the pieces on the board for a move (the board is only changed here and in unmovePieces so other board
+    representations only need to replace these two)
+    """
+    def movePieces(self, move):
+        self.board[move.startRow][move.startColumn] = "--"
+        # when moving a piece the location of that piece after it is moved will always be blank
+        self.board[move.endRow][move.endColumn] = move.pieceMoved
+        # moves selected piece into selected location
+
+        #pawn promotion
+        if move.isPawnPromotion:
+            self.board[move.endRow][move.endColumn] = move.pieceMoved[0] + "Q"  # changes the piece to a queen
 
-        if len(moves) == 0:  # stalemate or checkmate situation
-            if self.inCheck():
+        #enpassant
+        if move.isenPassantMove:
+            self.board[move.startRow][move.endColumn] = "--"  # capturing the pawn instead of just moving to blank space
+
+        # castling
+        if move.isCastleMove:
+            if move.endColumn - move.startColumn == 2:  # this is a king side castle
+                self.board[move.endRow][move.endColumn-1] = self.board[move.endRow][move.endColumn+1] # "new" rook being placed
+                self.board[move.endRow][move.endColumn+1] = "--"  # deletes old rook
+            else:   # queen side castle
+                self.board[move.endRow][move.endColumn+1] = self.board[move.endRow][move.endColumn-2] # moves the rook
+                self.board[move.endRow][move.endColumn - 2] = "--"  # deletes old rook
+
+    def unmovePieces(self, move):
+        self.board[move.startRow][move.startColumn] = move.pieceMoved   # opposite of movePieces since it reverses it
+        self.board[move.endRow][move.endColumn] = move.pieceCaptured    # captured piece places back on the board
+
+        if move.isenPassantMove:
+            self.board[move.endRow][move.endColumn] = "--"  # the piece captured is not where it would be placed
+            self.board[move.startRow][move.endColumn] = move.pieceCaptured
+
+        if move.isCastleMove:
+            if move.endColumn - move.startColumn == 2:  # kingside castle
+                self.board[move.endRow][move.endColumn+1] = self.board[move.endRow][move.endColumn-1]
+                self.board[move.endRow][move.endColumn - 1] = "--"  # reversing the castling
+            else:   # queenside castling
+                self.board[move.endRow][move.endColumn-2] = self.board[move.endRow][move.endColumn+1]
+                self.board[move.endRow][move.endColumn + 1] = "--"
+
+    """
+    Works out the Zobrist key of the position from scratch (makeMove keeps it up to date after this)
+    """
+    def computeZobristKey(self):
+        key = 0
+        for r in range(8):
+            for c in range(8):
+                key ^= zobristPieces[self.board[r][c]][r * 8 + c]
+        if not self.whitetomove:
+            key ^= zobristBlackToMove
+        if self.enPassantPossible != ():
+            key ^= zobristEnPassant[self.enPassantPossible[1]]
+        return key ^ zobristCastling[self.castlingRights]
+
+    def getValidMoves(self):    # All moves considering checks (valid moves)
+        validMoves, inCheck = self.getLegalMoves(ALLMOVES)
+        if len(validMoves) == 0:  # stalemate or checkmate situation
+            if inCheck:
                 self.Checkmate = True
             else:
                 self.Stalemate = True
         else:
             self.Checkmate = False
             self.Stalemate = False
+        return validMoves
 
-            self.enPassantPossible = tempEnpassantPossible  # save the value while we change and manipulate it
-            self.currentCastlingRights = tempCastleRights
-        return moves
+    """
+    Only the valid captures (including en passant) and pawn promotions, made without generating the quiet moves at
+    all. Used by the quiescence search. Does not change Checkmate or Stalemate since quiet moves are not looked at
+    """
+    def getCaptureMoves(self):
+        return self.getLegalMoves(CAPTURES)[0]
+
+    def getQuietMoves(self):  # the valid moves that are not in getCaptureMoves
+        return self.getLegalMoves(QUIETS)[0]
+
+    def getPieceMoves(self, r, c):  # valid moves of the piece on (r, c), none if it is not the player to move's piece
+        return self.getLegalMoves(ALLMOVES, (r, c))[0]
+
+    """
+    Valid moves in stages, generated only when the stage before has been used up: the hash move (the moveID of the
+    best move found here by an earlier search) if it is valid, then the captures, then the quiet moves. A search that
+    cuts off early never generates the later stages. sortStage is called on each stage's list of moves so it can order
+    them. Does not change Checkmate or Stalemate, so a search that gets no moves has to check inCheck() itself
+    """
+    def getStagedMoves(self, hashMoveID=0, sortStage=None):
+        if hashMoveID:  # moveID 0 (a8 to a8) is never a real move
+            start = hashMoveID >> 6
+            for move in self.getPieceMoves(start // 8, start % 8):
+                if move.moveID == hashMoveID:
+                    yield move
+                    break
+        for getMoves in (self.getCaptureMoves, self.getQuietMoves):
+            moves = getMoves()
+            if sortStage is not None:
+                sortStage(moves)
+            for move in moves:
+                if move.moveID != hashMoveID:
+                    yield move
+
+    """
+    Valid moves of one kind (ALLMOVES, CAPTURES or QUIETS) and whether the player to move is in check. When square is
+    given only the moves of the piece on that square are made
+    """
+    def getLegalMoves(self, kind, square=None):
+        if self.whitetomove:
+            kingRow, kingColumn = self.whiteKingLocation
+            enemyColour = "b"
+        else:
+            kingRow, kingColumn = self.blackKingLocation
+            enemyColour = "w"
+
+        # scan out from the king once to find the pieces giving check and the pieces pinned to the king
+        inCheck, pins, checks = self.checkForPinsAndChecks(kingRow, kingColumn)
+
+        # generate all possible moves
+        if kind == CAPTURES:
+            moves = self.getPossibleCaptures()
+        elif kind == QUIETS:
+            moves = self.getPossibleQuietMoves()
+        elif square is not None:
+            moves = []
+            self.getPossibleMovesFrom(square[0], square[1], moves)
+        else:
+            moves = self.getAllPossibleMoves()
+        if not inCheck and kind != CAPTURES and (square is None or square == (kingRow, kingColumn)):
+            self.getCastleMoves(kingRow, kingColumn, moves)
+
+        blockSquares = None  # squares a non king move has to land on to stop a single check
+        if len(checks) == 1:
+            checkRow, checkColumn, dr, dc = checks[0]
+            if self.board[checkRow][checkColumn][1] == "N":  # knight checks can only be stopped by capturing the knight
+                blockSquares = {(checkRow, checkColumn)}
+            else:
+                blockSquares = set()
+                for i in range(1, 8):  # every square between the king and the checking piece (including the piece)
+                    blockSquares.add((kingRow + dr * i, kingColumn + dc * i))
+                    if (kingRow + dr * i, kingColumn + dc * i) == (checkRow, checkColumn):
+                        break
+
+        validMoves = []
+        for move in moves:
+            if move.pieceMoved[1] == "K":
+                # the king cannot move onto a square the opponent covers (castling is checked the same way)
+                self.board[kingRow][kingColumn] = "--"  # lifts the king so it can not block an attack on itself
+                kingAttacked = self.isSquareAttacked(move.endRow, move.endColumn, enemyColour)
+                self.board[kingRow][kingColumn] = move.pieceMoved
+                if not kingAttacked:
+                    validMoves.append(move)
+            elif len(checks) > 1:
+                continue  # double check so only the king is able to move
+            elif move.isenPassantMove:
+                # en passant takes two pieces off the same row so it is checked by playing it out on the board
+                if self.enPassantIsValid(move, kingRow, kingColumn):
+                    validMoves.append(move)
+            else:
+                if (move.startRow, move.startColumn) in pins:  # pinned pieces can only move along the pin
+                    dr, dc = pins[(move.startRow, move.startColumn)]
+                    if (move.endRow - move.startRow) * dc != (move.endColumn - move.startColumn) * dr:
+                        continue
+                if blockSquares is None or (move.endRow, move.endColumn) in blockSquares:
+                    validMoves.append(move)
+        return validMoves, inCheck
+
+    """
+    Scans outwards from the square (r, c) for the side to move, returning whether the square is in check along with
+    the pinned pieces {(row, column): direction} and the checking pieces [(row, column, direction row, direction column)]
+    """
+    def checkForPinsAndChecks(self, r, c):
+        pins = {}
+        checks = []
+        inCheck = False
+        if self.whitetomove:
+            enemyColour, allyColour = "b", "w"
+        else:
+            enemyColour, allyColour = "w", "b"
+
+        for j in range(len(kingDirections)):
+            dr, dc = kingDirections[j]
+            possiblePin = ()  # the first of our own pieces along the direction could be pinned
+            for i in range(1, 8):
+                endRow = r + dr * i
+                endColumn = c + dc * i
+                if not (0 <= endRow <= 7 and 0 <= endColumn <= 7):
+                    break  # off the board
+                endPiece = self.board[endRow][endColumn]
+                if endPiece[0] == allyColour and endPiece[1] != "K":  # our own king is ignored so it can not block itself
+                    if possiblePin == ():
+                        possiblePin = (endRow, endColumn)
+                    else:
+                        break  # two of our own pieces in the way so nothing is pinned in this direction
+                elif endPiece[0] == enemyColour:
+                    pieceType = endPiece[1]
+                    # the first 4 directions are the rook directions and the last 4 are the bishop directions
+                    if (j < 4 and pieceType == "R") or (j >= 4 and pieceType == "B") or pieceType == "Q" or \
+                            (i == 1 and pieceType == "K") or \
+                            (i == 1 and pieceType == "p" and dr == (-1 if allyColour == "w" else 1) and j >= 4):
+                        if possiblePin == ():  # nothing blocking so it is a check
+                            inCheck = True
+                            checks.append((endRow, endColumn, dr, dc))
+                        else:   # our piece is blocking so it is pinned
+                            pins[possiblePin] = (dr, dc)
+                    break   # an enemy piece stops the scan either way
+
+        for dr, dc in knightDirections:     # knights jump so they can only ever give checks
+            endRow = r + dr
+            endColumn = c + dc
+            if 0 <= endRow <= 7 and 0 <= endColumn <= 7:
+                if self.board[endRow][endColumn] == enemyColour + "N":
+                    inCheck = True
+                    checks.append((endRow, endColumn, dr, dc))
+        return inCheck, pins, checks
+
+    """
+    En passant removes the captured pawn from beside the moving pawn which can uncover an attack on the king, so the
+    capture is played out on the board and the king is checked directly
+    """
+    def enPassantIsValid(self, move, kingRow, kingColumn):
+        self.board[move.startRow][move.startColumn] = "--"
+        self.board[move.startRow][move.endColumn] = "--"
+        self.board[move.endRow][move.endColumn] = move.pieceMoved
+        inCheck = self.checkForPinsAndChecks(kingRow, kingColumn)[0]
+        self.board[move.endRow][move.endColumn] = "--"
+        self.board[move.startRow][move.endColumn] = move.pieceCaptured
+        self.board[move.startRow][move.startColumn] = move.pieceMoved
+        return not inCheck
 
     """
     Determines whether the current player is in check
@@ -188,15 +583,66 @@ class GameState():
     """
     Determines whether an ememy is attacking the square (r, c), invalid for the king to move to
     """
-    def sqaureBeingAttacked(self, r, c):  # generates opposite players moves to check if king is under attack
-        self.whitetomove = not self.whitetomove  # switches to see opponents moves
-        oppMoves = self.getAllPossibleMoves()
-        self.whitetomove = not self.whitetomove  # switches back turns
-        for move in oppMoves:
-            if move.endRow == r and move.endColumn == c:
-                return True  # if the r and c match to the end row and column then the square is under attack
+    def sqaureBeingAttacked(self, r, c):
+        return self.isSquareAttacked(r, c, "b" if self.whitetomove else "w")  # the opponent of the player to move
+
+    """
+    Determines whether any piece of the given colour ("w" or "b") attacks the square (r, c). Walks outwards from the
+    square along the knight, pawn, king and sliding piece lines and stops at the first attacker found
+    """
+    def isSquareAttacked(self, r, c, colour):
+        board = self.board
+        pawn, knight, bishop, rook, queen, king = attackingPieces[colour]
+
+        pawnRow = r + 1 if colour == "w" else r - 1  # white pawns attack upwards so they sit on the row below
+        if 0 <= pawnRow <= 7:
+            if c != 0 and board[pawnRow][c-1] == pawn:
+                return True
+            if c != 7 and board[pawnRow][c+1] == pawn:
+                return True
+
+        for dr, dc in knightDirections:
+            endRow = r + dr
+            endColumn = c + dc
+            if 0 <= endRow <= 7 and 0 <= endColumn <= 7 and board[endRow][endColumn] == knight:
+                return True
+
+        for j in range(8):
+            dr, dc = kingDirections[j]
+            endRow = r + dr
+            endColumn = c + dc
+            if not (0 <= endRow <= 7 and 0 <= endColumn <= 7):
+                continue
+            endPiece = board[endRow][endColumn]
+            if endPiece == king:
+                return True
+            slider = rook if j < 4 else bishop  # the first 4 directions are the rook directions
+            while endPiece == "--":  # slide along the line until a piece or the edge of the board is reached
+                endRow += dr
+                endColumn += dc
+                if not (0 <= endRow <= 7 and 0 <= endColumn <= 7):
+                    break
+                endPiece = board[endRow][endColumn]
+            if endPiece == slider or endPiece == queen:
+                return True
         return False  # square is not under attack if an opponents piece does not cover the square
 
+    def getPossibleMovesFrom(self, r, c, moves):  # possible moves of the player to move's piece on (r, c), if any
+        piece = self.board[r][c]
+        if piece[0] == ("w" if self.whitetomove else "b"):
+            if piece[1] == "p":
+                self.getPawnMoves(r, c, moves)
+            elif piece[1] == "R":
+                self.getRookMoves(r, c, moves)
+            elif piece[1] == "N":
+                self.getKnightMoves(r, c, moves)
+            elif piece[1] == "B":
+                self.getBishopMoves(r, c, moves)
+            elif piece[1] == "Q":
+                self.getQueenMoves(r, c, moves)
+            else:
+                self.getKingMoves(r, c, moves)
+
     def getAllPossibleMoves(self):  # All possible moves not considering checks (some may be invalid)
         moves = []
         for r in range(len(self.board)):    # number of rows
@@ -219,6 +665,97 @@ class GameState():
 
         return moves
 
+    """
+    Captures (including en passant) and pawn moves onto the last row for the player to move, not considering checks.
+    Pieces only look at the first piece along each line, so no quiet moves are made
+    """
+    def getPossibleCaptures(self):
+        board = self.board
+        if self.whitetomove:
+            allyColour, enemyColour, forward, lastRow = "w", "b", -1, 0
+        else:
+            allyColour, enemyColour, forward, lastRow = "b", "w", 1, 7
+        moves = []
+        for r in range(8):
+            for c in range(8):
+                piece = board[r][c]
+                if piece[0] != allyColour:
+                    continue
+                pieceType = piece[1]
+                if pieceType == "p":
+                    endRow = r + forward
+                    if endRow == lastRow and board[endRow][c] == "--":  # promotion
+                        moves.append(Move((r, c), (endRow, c), board))
+                    for endColumn in (c - 1, c + 1):
+                        if 0 <= endColumn <= 7:
+                            if board[endRow][endColumn][0] == enemyColour:
+                                moves.append(Move((r, c), (endRow, endColumn), board))
+                            elif (endRow, endColumn) == self.enPassantPossible:
+                                moves.append(Move((r, c), (endRow, endColumn), board, isEnpassantMove=True))
+                elif pieceType == "N" or pieceType == "K":
+                    for dr, dc in knightDirections if pieceType == "N" else kingDirections:
+                        endRow = r + dr
+                        endColumn = c + dc
+                        if 0 <= endRow <= 7 and 0 <= endColumn <= 7 and board[endRow][endColumn][0] == enemyColour:
+                            moves.append(Move((r, c), (endRow, endColumn), board))
+                else:
+                    # the first 4 directions are the rook directions and the last 4 are the bishop directions
+                    directions = kingDirections[:4] if pieceType == "R" else \
+                        kingDirections[4:] if pieceType == "B" else kingDirections
+                    for dr, dc in directions:
+                        endRow = r + dr
+                        endColumn = c + dc
+                        while 0 <= endRow <= 7 and 0 <= endColumn <= 7:
+                            endPiece = board[endRow][endColumn]
+                            if endPiece != "--":
+                                if endPiece[0] == enemyColour:
+                                    moves.append(Move((r, c), (endRow, endColumn), board))
+                                break
+                            endRow += dr
+                            endColumn += dc
+        return moves
+
+    """
+    The moves getPossibleCaptures leaves out, apart from castling: moves onto empty squares that are not pawn
+    promotions
+    """
+    def getPossibleQuietMoves(self):
+        board = self.board
+        if self.whitetomove:
+            allyColour, forward, startRow, lastRow = "w", -1, 6, 0
+        else:
+            allyColour, forward, startRow, lastRow = "b", 1, 1, 7
+        moves = []
+        for r in range(8):
+            for c in range(8):
+                piece = board[r][c]
+                if piece[0] != allyColour:
+                    continue
+                pieceType = piece[1]
+                if pieceType == "p":
+                    endRow = r + forward
+                    if endRow != lastRow and board[endRow][c] == "--":
+                        moves.append(Move((r, c), (endRow, c), board))
+                        if r == startRow and board[endRow + forward][c] == "--":
+                            moves.append(Move((r, c), (endRow + forward, c), board))
+                elif pieceType == "N" or pieceType == "K":
+                    for dr, dc in knightDirections if pieceType == "N" else kingDirections:
+                        endRow = r + dr
+                        endColumn = c + dc
+                        if 0 <= endRow <= 7 and 0 <= endColumn <= 7 and board[endRow][endColumn] == "--":
+                            moves.append(Move((r, c), (endRow, endColumn), board))
+                else:
+                    directions = kingDirections[:4] if pieceType == "R" else \
+                        kingDirections[4:] if pieceType == "B" else kingDirections
+                    for dr, dc in directions:
+                        endRow = r + dr
+                        endColumn = c + dc
+                        while 0 <= endRow <= 7 and 0 <= endColumn <= 7 and board[endRow][endColumn] == "--":
+                            moves.append(Move((r, c), (endRow, endColumn), board))
+                            endRow += dr
+                            endColumn += dc
+        return moves
+
     """
     functions for calculate all possible moves for the pieces at (row, column) then add these moves to the list
     """
@@ -406,9 +943,9 @@ class GameState():
     def getCastleMoves(self, r, c, moves):
         if self.sqaureBeingAttacked(r, c):
             return  # cant castle when in check
-        if (self.whitetomove and self.currentCastlingRights.wks) or (not self.whitetomove and self.currentCastlingRights.bks):
+        if self.castlingRights & (WKS if self.whitetomove else BKS):
             self.getKingsideCastleMoves(r, c, moves)
-        if (self.whitetomove and self.currentCastlingRights.wqs) or (not self.whitetomove and self.currentCastlingRights.bqs):
+        if self.castlingRights & (WQS if self.whitetomove else BQS):
             self.getQueensideCastleMoves(r, c, moves)
 
     def getKingsideCastleMoves(self, r, c, moves):
@@ -422,6 +959,10 @@ class GameState():
                 moves.append(Move((r, c), (r, c - 2), self.board, isCastleMove=True))
 
 
+def castleRightsIndex(rights):  # the castle rights as a number from 0 to 15 (one bit for each right)
+    return rights.wks | rights.wqs << 1 | rights.bks << 2 | rights.bqs << 3
+
+
 class CastleRights():
     def __init__(self, wks, bks, wqs, bqs):  # each side a king can castle (king or queen side) for both sets of pieces
         self.wks = wks
@@ -441,16 +982,25 @@ class Move():
 # since the coordinates for the board is different due to the matrix notation we have to transfer them to the correct
 # columns and rows with the correct numbers (ranks) and letters (files)
 
+    # searches make millions of moves so they only get these fixed attributes instead of a dictionary each
+    __slots__ = ("startRow", "startColumn", "endRow", "endColumn", "pieceMoved", "pieceCaptured", "moveID",
+                 "isPawnPromotion", "isenPassantMove", "isCastleMove")
 
-    def __init__(self, startsq, endsq, board, isEnpassantMove = False, isCastleMove=False):  # storing information for the system
+    def __init__(self, startsq, endsq, board, isEnpassantMove = False, isCastleMove=False, pieceMoved=None,
+                 pieceCaptured=None):  # storing information for the system
         self.startRow = startsq[0]  # storing selected square to move
         self.startColumn = startsq[1]
         self.endRow = endsq[0]  # storing square to move to
         self.endColumn = endsq[1]
-        self.pieceMoved = board[self.startRow][self.startColumn]    # storing piece which is moving
-        self.pieceCaptured = board[self.endRow][self.endColumn]     # storing piece captured in the square moved to
+        if pieceMoved is None:  # the pieces can be given directly when there is no board to read them from
+            pieceMoved = board[self.startRow][self.startColumn]
+            pieceCaptured = board[self.endRow][self.endColumn]
+        self.pieceMoved = pieceMoved    # storing piece which is moving
+        self.pieceCaptured = pieceCaptured     # storing piece captured in the square moved to
 
-        self.moveID = self.startRow * 1000 + self.startColumn * 100 + self.endRow * 10 + self.endColumn # gives unique ID to each move so that it has something to compare to
+        self.moveID = (self.startRow * 8 + self.startColumn) << 6 | (self.endRow * 8 + self.endColumn)
+        # gives unique ID to each move so that it has something to compare to (start square and end square packed
+        # into 12 bits, so it can also index tables of 4096 moves)
 
         self.isPawnPromotion = False
         if (self.pieceMoved == "wp" and self.endRow == 0) or (self.pieceMoved == "bp" and self.endRow == 7):
@@ -470,6 +1020,9 @@ class Move():
             return self.moveID == other.moveID
         return False
 
+    def __hash__(self):  # equal moves have the same ID so moves can be used in sets and as dictionary keys
+        return self.moveID
+
     def ChessNotation(self):
         return self.RankFile(self.startRow, self.startColumn) + self.RankFile(self.endRow, self.endColumn)
         # returning the Chess Notation of moves made - instead of matrix coordinates
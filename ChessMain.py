@@ -1,13 +1,27 @@
 """main basis of game to play chess"""
 
+import os
 import pygame as p  # very good library for games
+import Assets
 import ChessEngine, AI   # now can access AI python file
+import Bitboard
+import OpeningBook
+import Profiling
+import Rendering
+import Tablebase
+import TranspositionTable
 import tkinter as tk
 
 width = height = 512
 dimension = 8
 square_size = height // dimension  # equal square size
 IMAGES = {}
+useBitboards = False  # plays on the bitboard version of the game state instead of the 8x8 list board
+ttSizeMB = 32  # memory the AI can use to remember positions it has searched
+aiMoveTime = 2.0  # seconds the AI can think for each move
+openingBookPath = os.path.join(os.path.dirname(os.path.abspath(__file__)), "book.bin")  # played without searching
+profileLogPath = None  # JSON lines file to record the stats of every AI move in (python Profiling.py)
+maxFPS = 30  # frames drawn a second at most, so the loop sleeps instead of spinning while nothing happens
 
 """
 Assigns pieces to an image
@@ -15,10 +29,7 @@ Assigns pieces to an image
 
 
 def loadimages():
-    pieces = ["wp", "wR", "wN", "wB", "wQ", "wK", "bp", "bR", "bN", "bB", "bQ", "bK"]
-    for piece in pieces:
-        IMAGES[piece] = p.transform.scale(p.image.load("D:/Documents/CODE/Chess/images/" + piece + ".png"),
-                                          (square_size, square_size))
+    IMAGES.update(Assets.loadPieceImages(square_size))
     # now we can access an image by just calling 'IMAGES[" "]' and has them scaled to the squares on the board
 
 
@@ -31,30 +42,41 @@ def maingame():
     screen = p.display.set_mode((width, height))
     clock = p.time.Clock()
     screen.fill(p.Color("white"))
-    gs = ChessEngine.GameState()  # current status of board
+    gs = Bitboard.BitboardGameState() if useBitboards else ChessEngine.GameState()  # current status of board
     print(gs.board)
     loadimages()
+    if profileLogPath is not None:
+        Profiling.enable(profileLogPath)
+    renderer = Rendering.BoardRenderer(screen, IMAGES, square_size, dimension)  # only redraws squares that changed
     running = True
 
     square_selected = ()  # keep track of the last click of the user (row, column)
     player_clicks = []  # where the player clicks [(5,6), (6,6)] - moving piece to new square
     # stores two values of starting square (piece) and location
 
+    tt = TranspositionTable.TranspositionTable(ttSizeMB)  # kept for the whole game so each search reuses the last
+    book = OpeningBook.OpeningBook(openingBookPath) if os.path.exists(openingBookPath) else None
+    tablebases = Tablebase.Tablebases()  # whichever tables have been generated (python Tablebase.py)
     validMoves = gs.getValidMoves() # now we have it in the main so that we can compare the move inputted to check if the move is valid
+    validMoveLookup = {move: move for move in validMoves}  # finds the valid move matching a clicked move in one step
     moveMade = False  # only moves valid moves (flag variable)
+    gameOver = False  # checkmate, stalemate or a draw by repetition or the fifty move rule
 
     playerOne = True    # if a human is playing white then this will be true, if AI is playing then Fasle
     playerTwo = False   # same but for black
+    aiSearch = None     # the AI's search running in the background while it is thinking
 
     while running:
         humanTurn = ((gs.whitetomove and playerOne) or (not gs.whitetomove and playerTwo)) # boolean expression to make sure its a human playing
         for events in p.event.get():
             if events.type == p.QUIT:
+                if aiSearch is not None:
+                    aiSearch.cancel()
                 quit()
                 running = False
                 # MOUSE OPERATIONS
             elif events.type == p.MOUSEBUTTONDOWN:
-                if humanTurn:  # now person can only interact if it is their turn
+                if humanTurn and not gameOver:  # now person can only interact if it is their turn
                     location = p.mouse.get_pos()  # gets the (x, y) location of the mouse where it clicks
                     column = location[0]//square_size
                     row = location[1]//square_size  # uses the (x, y) coordinates to allocate a square being clicked
@@ -67,66 +89,53 @@ def maingame():
 
                     if len(player_clicks) == 2:  # second click (player wanting to move the piece)
                         move = ChessEngine.Move(player_clicks[0], player_clicks[1], gs.board)
-                        for i in range(len(validMoves)):
-                            if move == validMoves[i]:   # prevents bugs for en passant and promotion
-                                gs.makeMove(validMoves[i])
-                                print(move.ChessNotation())
-                                moveMade = True
-                                # move current square into new square and updates board accordingly
-                                square_selected = ()  # resets user clicks so next user can click
-                                player_clicks = []
+                        validMove = validMoveLookup.get(move)   # prevents bugs for en passant and promotion
+                        if validMove is not None:
+                            gs.makeMove(validMove)
+                            print(move.ChessNotation())
+                            moveMade = True
+                            # move current square into new square and updates board accordingly
+                            square_selected = ()  # resets user clicks so next user can click
+                            player_clicks = []
                         if not moveMade:
                             player_clicks = [square_selected]  # the second click of an invalid move is not registered
 
                     # KEYBOARD OPERATIONS
             elif events.type == p.KEYDOWN:
                 if events.key == p.K_z:  # when "z" key is pressed, undo move
+                    if aiSearch is not None:    # stops the AI thinking about a position that is being undone
+                        aiSearch.cancel()
+                        aiSearch = None
                     gs.undoMove()
                     moveMade = True
+            elif events.type == p.VIDEOEXPOSE:  # the window was uncovered so every square has to be drawn again
+                renderer.invalidate()
 
         #AI move generator
-        if running and not humanTurn:
-            AIMove = AI.findGreedyMove(gs, validMoves)  # greedy algorithm
-            if AIMove is None:
-                AIMove = AI.findRandomMove(validMoves)  # close to checkmate and the engine somewhat gives up
-            gs.makeMove(AIMove)
-            moveMade = True
+        if running and not humanTurn and not moveMade and not gameOver:
+            if aiSearch is None:    # starts thinking in the background so the window keeps responding
+                aiSearch = AI.BackgroundSearch(gs, AI.MAXDEPTH, tt, movetime=aiMoveTime, book=book,
+                                               tablebases=tablebases)  # book, tablebases or search
+            elif aiSearch.done():   # checked every frame until the search has finished
+                AIMove = validMoveLookup.get(aiSearch.result())
+                if AIMove is None:
+                    AIMove = AI.findRandomMove(validMoves)  # close to checkmate and the engine somewhat gives up
+                gs.makeMove(AIMove)
+                aiSearch = None
+                moveMade = True
 
         if moveMade:    # needs to generate new valid moves since new moves will be made
             validMoves = gs.getValidMoves()
+            validMoveLookup = {move: move for move in validMoves}
             moveMade = False
-
-        drawgamestate(screen, gs)  # gs = game state
-        p.display.flip()
-
-
-"""
-Responsible for the graphics
-"""
-
-
-def drawgamestate(screen, gs):
-    drawboard(screen)  # draw squares on the board
-    # can add piece highlighting and move suggestion here
-    drawpieces(screen, gs.board)  # draw pieces on top of the squares
-
-
-def drawboard(screen):
-    colors = [p.Color("white"), p.Color("dark gray")]
-    for rows in range(dimension):
-        for columns in range(dimension):
-            color = colors[((rows + columns) % 2)]
-            # can determine the colour by thinking of the board as coordinates with this formula remainder 1 = black and remainder 0 = white
-            p.draw.rect(screen, color, p.Rect(columns * square_size, rows * square_size, square_size, square_size))
-            # draws a rectangle of the row 8 times which creates the square board
-
-
-def drawpieces(screen, board):
-    for rows in range(dimension):
-        for columns in range(dimension):
-            piece = board[rows][columns]
-            if piece != "--":  # not an empty square
-                screen.blit(IMAGES[piece], p.Rect(columns * square_size, rows * square_size, square_size, square_size))
+            drawReason = gs.drawByRule() if len(validMoves) != 0 else None
+            gameOver = len(validMoves) == 0 or drawReason is not None
+            if drawReason is not None:
+                print("Draw by " + drawReason)
+
+        if running:
+            renderer.redraw(gs.board)  # gs = game state
+        clock.tick(maxFPS)
 
 
 """
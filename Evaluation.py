@@ -0,0 +1,178 @@
+"""
+Evaluation tables. Material is counted in pawns (pieceScore) and each piece also gets a bonus or penalty for the square
+it stands on, with one set of tables for the middlegame and one for the endgame. GameState keeps running totals of
+all of these as moves are made, so scoring a position is a few additions instead of looking at all 64 squares
+"""
+
+pieceScore = {"K": 0, "Q": 10, "R": 5, "B": 3, "N": 3, "p": 1}
+phaseScore = {"K": 0, "Q": 4, "R": 2, "B": 1, "N": 1, "p": 0}  # how much each piece counts towards the middlegame
+MAXPHASE = 24  # phase of the starting position (4 knights, 4 bishops, 4 rooks and 2 queens)
+
+# piece square tables in hundredths of a pawn, written from white's side of the board (row 0 is the 8th rank)
+pawnTable = [
+    0, 0, 0, 0, 0, 0, 0, 0,
+    50, 50, 50, 50, 50, 50, 50, 50,
+    10, 10, 20, 30, 30, 20, 10, 10,
+    5, 5, 10, 25, 25, 10, 5, 5,
+    0, 0, 0, 20, 20, 0, 0, 0,
+    5, -5, -10, 0, 0, -10, -5, 5,
+    5, 10, 10, -20, -20, 10, 10, 5,
+    0, 0, 0, 0, 0, 0, 0, 0,
+]
+pawnEndgameTable = [
+    0, 0, 0, 0, 0, 0, 0, 0,
+    80, 80, 80, 80, 80, 80, 80, 80,
+    50, 50, 50, 50, 50, 50, 50, 50,
+    30, 30, 30, 30, 30, 30, 30, 30,
+    20, 20, 20, 20, 20, 20, 20, 20,
+    10, 10, 10, 10, 10, 10, 10, 10,
+    10, 10, 10, 10, 10, 10, 10, 10,
+    0, 0, 0, 0, 0, 0, 0, 0,
+]
+knightTable = [
+    -50, -40, -30, -30, -30, -30, -40, -50,
+    -40, -20, 0, 0, 0, 0, -20, -40,
+    -30, 0, 10, 15, 15, 10, 0, -30,
+    -30, 5, 15, 20, 20, 15, 5, -30,
+    -30, 0, 15, 20, 20, 15, 0, -30,
+    -30, 5, 10, 15, 15, 10, 5, -30,
+    -40, -20, 0, 5, 5, 0, -20, -40,
+    -50, -40, -30, -30, -30, -30, -40, -50,
+]
+bishopTable = [
+    -20, -10, -10, -10, -10, -10, -10, -20,
+    -10, 0, 0, 0, 0, 0, 0, -10,
+    -10, 0, 5, 10, 10, 5, 0, -10,
+    -10, 5, 5, 10, 10, 5, 5, -10,
+    -10, 0, 10, 10, 10, 10, 0, -10,
+    -10, 10, 10, 10, 10, 10, 10, -10,
+    -10, 5, 0, 0, 0, 0, 5, -10,
+    -20, -10, -10, -10, -10, -10, -10, -20,
+]
+rookTable = [
+    0, 0, 0, 0, 0, 0, 0, 0,
+    5, 10, 10, 10, 10, 10, 10, 5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    0, 0, 0, 5, 5, 0, 0, 0,
+]
+queenTable = [
+    -20, -10, -10, -5, -5, -10, -10, -20,
+    -10, 0, 0, 0, 0, 0, 0, -10,
+    -10, 0, 5, 5, 5, 5, 0, -10,
+    -5, 0, 5, 5, 5, 5, 0, -5,
+    0, 0, 5, 5, 5, 5, 0, -5,
+    -10, 5, 5, 5, 5, 5, 0, -10,
+    -10, 0, 5, 0, 0, 0, 0, -10,
+    -20, -10, -10, -5, -5, -10, -10, -20,
+]
+kingTable = [  # stay behind the pawns while there are pieces around to attack the king
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -20, -30, -30, -40, -40, -30, -30, -20,
+    -10, -20, -20, -20, -20, -20, -20, -10,
+    20, 20, 0, 0, 0, 0, 20, 20,
+    20, 30, 10, 0, 0, 10, 30, 20,
+]
+kingEndgameTable = [  # come to the middle once the pieces are gone
+    -50, -40, -30, -20, -20, -30, -40, -50,
+    -30, -20, -10, 0, 0, -10, -20, -30,
+    -30, -10, 20, 30, 30, 20, -10, -30,
+    -30, -10, 30, 40, 40, 30, -10, -30,
+    -30, -10, 30, 40, 40, 30, -10, -30,
+    -30, -10, 20, 30, 30, 20, -10, -30,
+    -30, -30, 0, 0, 0, 0, -30, -30,
+    -50, -30, -30, -30, -30, -30, -30, -50,
+]
+middlegameTables = {"p": pawnTable, "N": knightTable, "B": bishopTable, "R": rookTable, "Q": queenTable,
+                    "K": kingTable}
+endgameTables = {"p": pawnEndgameTable, "N": knightTable, "B": bishopTable, "R": rookTable, "Q": queenTable,
+                 "K": kingEndgameTable}
+
+
+def colourTables(tables):  # one table per piece ("wp", "bK", ...) counted from white's side: positive is good for white
+    colourTables = {"--": [0] * 64}
+    for piece, table in tables.items():
+        colourTables["w" + piece] = table[:]
+        colourTables["b" + piece] = [-table[(7 - sq // 8) * 8 + sq % 8] for sq in range(64)]  # mirrored for black
+    return colourTables
+
+
+middlegameScore = colourTables(middlegameTables)
+endgameScore = colourTables(endgameTables)
+materialScore = {"--": 0}
+phaseOfPiece = {"--": 0}
+for piece in pieceScore:
+    materialScore["w" + piece] = pieceScore[piece]
+    materialScore["b" + piece] = -pieceScore[piece]
+    phaseOfPiece["w" + piece] = phaseOfPiece["b" + piece] = phaseScore[piece]
+
+
+"""
+Totals for a whole board: (material, middlegame squares, endgame squares, phase)
+"""
+
+
+def boardTotals(board):
+    material = middlegame = endgame = phase = 0
+    for r in range(8):
+        for c in range(8):
+            piece = board[r][c]
+            if piece != "--":
+                material += materialScore[piece]
+                middlegame += middlegameScore[piece][r * 8 + c]
+                endgame += endgameScore[piece][r * 8 + c]
+                phase += phaseOfPiece[piece]
+    return material, middlegame, endgame, phase
+
+
+"""
+How much a move changes each of the totals, covering captures, en passant, promotion to a queen and the rook moving
+when castling
+"""
+
+
+def moveTotals(move):
+    start = move.startRow * 8 + move.startColumn
+    end = move.endRow * 8 + move.endColumn
+    moved = move.pieceMoved
+    placed = moved[0] + "Q" if move.isPawnPromotion else moved
+    material = materialScore[placed] - materialScore[moved]
+    middlegame = middlegameScore[placed][end] - middlegameScore[moved][start]
+    endgame = endgameScore[placed][end] - endgameScore[moved][start]
+    phase = phaseOfPiece[placed] - phaseOfPiece[moved]
+
+    captured = move.pieceCaptured
+    if captured != "--":
+        capturedSq = move.startRow * 8 + move.endColumn if move.isenPassantMove else end
+        material -= materialScore[captured]
+        middlegame -= middlegameScore[captured][capturedSq]
+        endgame -= endgameScore[captured][capturedSq]
+        phase -= phaseOfPiece[captured]
+
+    if move.isCastleMove:
+        rook = moved[0] + "R"
+        if move.endColumn - move.startColumn == 2:  # king side rook
+            rookStart, rookEnd = end + 1, end - 1
+        else:
+            rookStart, rookEnd = end - 2, end + 1
+        middlegame += middlegameScore[rook][rookEnd] - middlegameScore[rook][rookStart]
+        endgame += endgameScore[rook][rookEnd] - endgameScore[rook][rookStart]
+    return material, middlegame, endgame, phase
+
+
+"""
+Score of the position from white's side (positive = winning for white) in pawns, using the running totals on the game
+state. The square tables are blended between the middlegame and endgame ones by how much material is left
+"""
+
+
+def scorePosition(gs):
+    phase = min(gs.phase, MAXPHASE)  # promotions can take the phase above the start
+    positional = gs.middlegameScore * phase + gs.endgameScore * (MAXPHASE - phase)
+    return gs.material + positional / (MAXPHASE * 100)
@@ -0,0 +1,286 @@
+"""
+Headless engine against engine matches, for measuring whether a change to the AI made it stronger. Two players are
+given as a kind with options, and every opening is played twice with the colours swapped. Games run in parallel on a
+pool of worker processes, and the result is reported as wins, draws and losses with the Elo difference. An SPRT
+(sequential probability ratio test) stops the match as soon as it is clear enough whether the first player is stronger:
+
+    python MatchRunner.py "search:depth=3" greedy --games 200
+    python MatchRunner.py "search:movetime=0.2" "search:depth=2" --tc 10+0.1 --openings openings.txt --sprt 0 10
+
+Players are random, greedy or search, with options after a colon: depth, movetime (seconds a move, instead of the
+time control), tt (transposition table MB), book (opening book file) and tablebases (1 to use the default tables)
+"""
+import argparse
+import math
+import multiprocessing
+import os
+import time
+
+import AI
+import Bitboard
+import ChessEngine
+import OpeningBook
+import Tablebase
+import TranspositionTable
+
+STARTFEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+playerKinds = ("random", "greedy", "search")
+
+
+def parsePlayer(text):  # "search:depth=3,tt=16" into ("search", {"depth": "3", "tt": "16"})
+    kind, _, optionText = text.partition(":")
+    if kind not in playerKinds:
+        raise ValueError("unknown player %r (expected one of %s)" % (kind, ", ".join(playerKinds)))
+    options = {}
+    for option in optionText.split(","):
+        if option:
+            name, _, value = option.partition("=")
+            options[name] = value
+    return kind, options
+
+
+class Player():
+    def __init__(self, text):
+        self.name = text
+        self.kind, options = parsePlayer(text)
+        self.depth = int(options["depth"]) if "depth" in options else None
+        self.movetime = float(options["movetime"]) if "movetime" in options else None
+        self.tt = TranspositionTable.TranspositionTable(float(options.get("tt", 16))) if self.kind != "random" else None
+        self.book = OpeningBook.OpeningBook(options["book"]) if "book" in options else None
+        self.tablebases = Tablebase.Tablebases() if options.get("tablebases") == "1" else None
+
+    def newGame(self):
+        if self.tt is not None:
+            self.tt.clear()
+
+    """
+    The player's move for the position. clock is the time it has left, which a search spreads over the moves still
+    to play unless the player has its own movetime
+    """
+    def chooseMove(self, gs, validMoves, clock=None, increment=0):
+        if self.kind == "random":
+            return AI.findRandomMove(validMoves)
+        if self.kind == "greedy":
+            move = AI.findGreedyMove(gs, validMoves, self.tt)
+            return move if move is not None else AI.findRandomMove(validMoves)
+        if self.movetime is not None or clock is not None:
+            control = AI.SearchController(self.movetime, clock, increment)
+            depth = self.depth or AI.MAXDEPTH
+        else:
+            control = None
+            depth = self.depth or AI.DEPTH
+        return AI.findBestMove(gs, validMoves, depth, self.tt, control, book=self.book, tablebases=self.tablebases)
+
+
+workerPlayers = None  # the two players of the match, made once in each worker process
+workerSettings = {}
+
+
+def initWorker(first, second, settings):
+    global workerPlayers
+    workerPlayers = (Player(first), Player(second))
+    workerSettings.update(settings)
+
+
+"""
+Plays one game in a worker. task is (game number, opening FEN, whether the first player is white). Returns
+(game number, the first player's score (1, 0.5 or 0), how the game ended, plies played, whether the first player
+was white)
+"""
+
+
+def playGame(task):
+    number, fen, firstIsWhite = task
+    gameStateClass = Bitboard.BitboardGameState if workerSettings["bitboard"] else ChessEngine.GameState
+    gs = gameStateClass.from_fen(fen)
+    white, black = workerPlayers if firstIsWhite else workerPlayers[::-1]
+    white.newGame()
+    black.newGame()
+    timeControl = workerSettings["timeControl"]
+    clocks = {True: timeControl[0], False: timeControl[0]} if timeControl else None
+    increment = timeControl[1] if timeControl else 0
+
+    whiteScore = None
+    reason = None
+    plies = 0
+    while whiteScore is None:
+        validMoves = gs.getValidMoves()
+        if gs.Checkmate:
+            whiteScore, reason = (0.0 if gs.whitetomove else 1.0), "checkmate"
+        elif gs.Stalemate:
+            whiteScore, reason = 0.5, "stalemate"
+        elif gs.drawByRule() is not None:
+            whiteScore, reason = 0.5, gs.drawByRule()
+        elif plies >= workerSettings["maxPlies"]:
+            whiteScore, reason = 0.5, "adjudicated"
+        else:
+            player = white if gs.whitetomove else black
+            clock = clocks[gs.whitetomove] if clocks else None
+            start = time.perf_counter()
+            move = player.chooseMove(gs, validMoves, clock, increment)
+            if clocks:
+                clocks[gs.whitetomove] -= time.perf_counter() - start
+                if clocks[gs.whitetomove] < 0:
+                    whiteScore, reason = (0.0 if gs.whitetomove else 1.0), "time forfeit"
+                    break
+                clocks[gs.whitetomove] += increment
+            gs.makeMove(move)
+            plies += 1
+    score = whiteScore if firstIsWhite else 1.0 - whiteScore
+    return number, score, reason, plies, firstIsWhite
+
+
+"""
+Openings from a file: each line is a FEN or a list of moves in algebraic notation from the starting position (blank
+lines and lines starting with # are skipped). Returns the FENs
+"""
+
+
+def readOpenings(path):
+    openings = []
+    with open(path) as file:
+        for line in file:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if "/" in line:
+                openings.append(line)
+                continue
+            gs = ChessEngine.GameState()
+            for san in next(OpeningBook.readGames([line]), []):
+                move = OpeningBook.moveFromSan(san, gs.getValidMoves())
+                if move is None:
+                    raise ValueError("%s: %r is not a valid move in %r" % (path, san, line))
+                gs.makeMove(move)
+            openings.append(gs.to_fen())
+    return openings
+
+
+"""
+Match statistics from the first player's side. The Elo difference comes from the average score, with a 95% error
+margin from the spread of the game results
+"""
+
+
+def eloFromScore(score):
+    if score <= 0.0:
+        return -math.inf
+    if score >= 1.0:
+        return math.inf
+    return -400 * math.log10(1 / score - 1)
+
+
+def scoreFromElo(elo):
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+def matchStatistics(wins, draws, losses):
+    games = wins + draws + losses
+    if games == 0:
+        return 0.0, 0.0, 0.0
+    score = (wins + 0.5 * draws) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    margin = 1.96 * math.sqrt(variance / games)
+    elo = eloFromScore(score)
+    low = eloFromScore(score - margin)
+    high = eloFromScore(score + margin)
+    return elo, (high - low) / 2 if math.isfinite(low) and math.isfinite(high) else math.inf, score
+
+
+"""
+Log likelihood ratio of the results for the SPRT between H0 (the Elo difference is elo0) and H1 (it is elo1), using the
+normal approximation to the results. Half a game of each result is added so a one sided run of results still has a
+spread. The test stops when it passes the bounds worked out from alpha and beta (the chances of accepting H1 when H0
+is true and the other way round)
+"""
+
+
+def sprtLogLikelihoodRatio(wins, draws, losses, elo0, elo1):
+    wins += 0.5
+    draws += 0.5
+    losses += 0.5
+    games = wins + draws + losses
+    score = (wins + 0.5 * draws) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    score0 = scoreFromElo(elo0)
+    score1 = scoreFromElo(elo1)
+    return games * (score1 - score0) * (2 * score - score0 - score1) / (2 * variance)
+
+
+def sprtBounds(alpha, beta):
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play matches between two AI players")
+    parser.add_argument("first", help="player being tested, e.g. \"search:depth=3\"")
+    parser.add_argument("second", help="player to compare against, e.g. greedy")
+    parser.add_argument("--games", type=int, default=100, help="games to play (rounded up to a pair per opening)")
+    parser.add_argument("--openings", help="file of opening FENs or move lists (the starting position if not given)")
+    parser.add_argument("--tc", help="time control per player as seconds+increment, e.g. 10+0.1")
+    parser.add_argument("--max-plies", type=int, default=300, help="games this long are adjudicated as draws")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--bitboard", action="store_true", help="play on the bitboard game state")
+    parser.add_argument("--sprt", type=float, nargs=2, metavar=("ELO0", "ELO1"),
+                        help="stop early once H0 (Elo difference ELO0) or H1 (ELO1) is accepted")
+    parser.add_argument("--alpha", type=float, default=0.05)
+    parser.add_argument("--beta", type=float, default=0.05)
+    args = parser.parse_args()
+
+    for player in (args.first, args.second):
+        try:
+            parsePlayer(player)  # reports a mistyped player before any processes are started
+        except ValueError as error:
+            parser.error(str(error))
+    timeControl = None
+    if args.tc:
+        base, _, increment = args.tc.partition("+")
+        timeControl = (float(base), float(increment or 0))
+    openings = readOpenings(args.openings) if args.openings else [STARTFEN]
+
+    pairs = (args.games + 1) // 2
+    tasks = [(2 * i + swap, openings[i % len(openings)], swap == 0) for i in range(pairs) for swap in (0, 1)]
+    settings = {"timeControl": timeControl, "maxPlies": args.max_plies, "bitboard": args.bitboard}
+    lowerBound, upperBound = sprtBounds(args.alpha, args.beta) if args.sprt else (None, None)
+
+    wins = draws = losses = 0
+    reasons = {}
+    verdict = None
+    start = time.perf_counter()
+    pool = multiprocessing.Pool(args.workers, initWorker, (args.first, args.second, settings))
+    try:
+        for number, score, reason, plies, firstIsWhite in pool.imap_unordered(playGame, tasks):
+            if score == 1.0:
+                wins += 1
+            elif score == 0.0:
+                losses += 1
+            else:
+                draws += 1
+            reasons[reason] = reasons.get(reason, 0) + 1
+            games = wins + draws + losses
+            elo, margin, average = matchStatistics(wins, draws, losses)
+            line = "game %d/%d: W %d D %d L %d  score %.3f  Elo %+.1f +/- %.1f" % (
+                games, len(tasks), wins, draws, losses, average, elo, margin)
+            if args.sprt:
+                llr = sprtLogLikelihoodRatio(wins, draws, losses, args.sprt[0], args.sprt[1])
+                line += "  LLR %.2f (%.2f, %.2f)" % (llr, lowerBound, upperBound)
+                if llr >= upperBound:
+                    verdict = "H1 accepted: %s is at least %g Elo stronger" % (args.first, args.sprt[1])
+                elif llr <= lowerBound:
+                    verdict = "H0 accepted: %s is not %g Elo stronger" % (args.first, args.sprt[1])
+            print(line, flush=True)
+            if verdict is not None:
+                break
+    finally:
+        pool.terminate()  # stops the games still being played when the SPRT finished early
+        pool.join()
+
+    seconds = time.perf_counter() - start
+    print("%s vs %s: %d games in %.1fs" % (args.first, args.second, wins + draws + losses, seconds))
+    print("results: " + ", ".join("%s %d" % (reason, count) for reason, count in sorted(reasons.items())))
+    if verdict is not None:
+        print(verdict)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Move ordering for the AI search. Alpha beta prunes the most when the best move is searched first, so moves are sorted
+by how likely they are to be good: the best move stored in the transposition table, then captures (most valuable
+victim, least valuable attacker), then quiet moves that caused cut offs elsewhere (killer moves and the history table)
+"""
+from TranspositionTable import NOMOVE
+
+TTMOVESCORE = 1000000
+CAPTURESCORE = 100000   # captures come before every quiet move
+KILLERSCORE = 90000     # quiet moves that cut off at the same depth in another part of the search
+MAXPLY = 128
+
+
+class MoveOrderer():
+    def __init__(self, pieceScore):  # pieceScore: value of each piece type, the same table the AI scores material with
+        self.pieceScore = pieceScore
+        self.killers = [[NOMOVE, NOMOVE] for ply in range(MAXPLY)]  # two killer moves for each ply
+        self.history = [0] * 4096  # indexed by moveID (start square and end square)
+        self.cutoffs = 0
+        self.firstMoveCutoffs = 0
+
+    """
+    Called at the start of each search: killers only make sense within one search, and the history is halved so
+    older searches count for less
+    """
+    def newSearch(self):
+        for killers in self.killers:
+            killers[0] = killers[1] = NOMOVE
+        for i in range(4096):
+            self.history[i] >>= 1
+        self.cutoffs = 0
+        self.firstMoveCutoffs = 0
+
+    def scoreMove(self, move, ply, ttMove=NOMOVE):
+        if move.moveID == ttMove:
+            return TTMOVESCORE
+        score = 0
+        if move.pieceCaptured != "--":  # most valuable victim first, then the least valuable attacker
+            score = CAPTURESCORE + 10 * self.pieceScore[move.pieceCaptured[1]] - self.pieceScore[move.pieceMoved[1]]
+        if move.isPawnPromotion:
+            score += CAPTURESCORE + 10 * self.pieceScore["Q"]
+        if score:
+            return score
+        if ply < MAXPLY and move.moveID in self.killers[ply]:
+            return KILLERSCORE + (move.moveID == self.killers[ply][0])
+        return self.history[move.moveID]
+
+    def orderMoves(self, moves, ply=0, ttMove=NOMOVE):  # sorts the moves in place, best first
+        moves.sort(key=lambda move: self.scoreMove(move, ply, ttMove), reverse=True)
+        return moves
+
+    """
+    Called when a move causes a beta cut off. moveIndex is where the move was in the ordered list, so a well ordered
+    search has most cut offs on the first move
+    """
+    def recordCutoff(self, move, ply, depth, moveIndex):
+        self.cutoffs += 1
+        if moveIndex == 0:
+            self.firstMoveCutoffs += 1
+        if move.pieceCaptured == "--" and not move.isPawnPromotion:  # captures are already ordered first
+            if ply < MAXPLY and self.killers[ply][0] != move.moveID:
+                self.killers[ply][1] = self.killers[ply][0]
+                self.killers[ply][0] = move.moveID
+            self.history[move.moveID] += depth * depth  # deeper cut offs save more work so count for more
+
+    def firstMoveCutoffRate(self):
+        return self.firstMoveCutoffs / self.cutoffs if self.cutoffs else 0.0
+
+    def stats(self):
+        return {"cutoffs": self.cutoffs, "firstMoveCutoffs": self.firstMoveCutoffs,
+                "firstMoveCutoffRate": self.firstMoveCutoffRate()}
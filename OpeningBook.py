@@ -0,0 +1,239 @@
+"""
+Opening book. A book file is a list of fixed size records (position's Zobrist key, moveID, weight) sorted by key, so a
+position's moves are found by binary search. The file is read through mmap: opening it reads nothing until a lookup
+touches a page, and every process that opens the same book shares the same pages of memory.
+
+Books are built from games in PGN (or plain lists of moves in the same notation):
+
+    python OpeningBook.py games.pgn --output book.bin --plies 16
+    python OpeningBook.py games.pgn --output book.bin --fen "<FEN>"     shows the book moves for a position
+"""
+import argparse
+import mmap
+import os
+import random
+import re
+import struct
+
+import ChessEngine
+from ChessEngine import Move
+
+recordFormat = struct.Struct(">QHH")  # big endian so the file sorts the same way as the numbers
+keyFormat = struct.Struct(">Q")
+MAXWEIGHT = 65535
+
+resultTokens = {"1-0", "0-1", "1/2-1/2", "*"}
+# comments, variations, numeric annotations, move numbers ("12." and "12...") and anything left between moves
+pgnNoise = re.compile(r"\{[^}]*\}|;[^\n]*|\$\d+|\d+\.(\.\.)?")
+
+
+class OpeningBook():
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        size = os.fstat(self.file.fileno()).st_size
+        self.entries = size // recordFormat.size
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    """
+    Returns [(moveID, weight)] stored for the position with the given key, or [] if it is not in the book
+    """
+    def lookup(self, key):
+        low = 0
+        high = self.entries
+        while low < high:  # finds the first record with a key not less than the one looked for
+            middle = (low + high) // 2
+            if keyFormat.unpack_from(self.data, middle * recordFormat.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        moves = []
+        while low < self.entries:
+            recordKey, moveID, weight = recordFormat.unpack_from(self.data, low * recordFormat.size)
+            if recordKey != key:
+                break
+            moves.append((moveID, weight))
+            low += 1
+        return moves
+
+    """
+    Picks one of the book moves for the position at random, with more weight on the moves played more often. Returns
+    the matching move from validMoves or None when the position is not in the book
+    """
+    def findMove(self, gs, validMoves):
+        movesByID = {move.moveID: move for move in validMoves}
+        bookMoves = [(movesByID[moveID], weight) for moveID, weight in self.lookup(gs.zobristKey)
+                     if moveID in movesByID and weight > 0]
+        if not bookMoves:
+            return None
+        return random.choices([move for move, weight in bookMoves], [weight for move, weight in bookMoves])[0]
+
+    def close(self):
+        if self.entries:
+            self.data.close()
+        self.file.close()
+
+    def __len__(self):
+        return self.entries
+
+    # a book sent to another process is opened again there from its file, so the processes share the mapped pages
+    def __getstate__(self):
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"])
+
+
+"""
+Finds the valid move written in standard algebraic notation ("Nf3", "exd5", "O-O", "e8=Q+"). Returns None if no
+single valid move matches, which includes promotions to anything but a queen since the engine only makes queens
+"""
+
+
+def moveFromSan(san, validMoves):
+    san = san.rstrip("+#!?")
+    if san in ("O-O", "0-0", "O-O-O", "0-0-0"):
+        kingSide = len(san) == 3
+        for move in validMoves:
+            if move.isCastleMove and (move.endColumn > move.startColumn) == kingSide:
+                return move
+        return None
+
+    promotion = None
+    if "=" in san:
+        san, promotion = san.split("=", 1)
+    elif len(san) > 2 and san[-1] in "QRBN" and san[0] in "abcdefgh":
+        san, promotion = san[:-1], san[-1]  # promotions written without the "=" (e8Q)
+    if promotion is not None and promotion != "Q":
+        return None
+
+    pieceType = san[0] if san[0] in "KQRBN" else "p"
+    if pieceType != "p":
+        san = san[1:]
+    destination = san[-2:]
+    if len(destination) != 2 or destination[0] not in Move.LetterDictionary or \
+            destination[1] not in Move.NumberDictionary:
+        return None
+    endRow = Move.NumberDictionary[destination[1]]
+    endColumn = Move.LetterDictionary[destination[0]]
+    disambiguation = san[:-2].replace("x", "")
+
+    found = None
+    for move in validMoves:
+        if move.pieceMoved[1] != pieceType or move.endRow != endRow or move.endColumn != endColumn:
+            continue
+        if any((char in Move.LetterDictionary and Move.LetterDictionary[char] != move.startColumn) or
+               (char in Move.NumberDictionary and Move.NumberDictionary[char] != move.startRow)
+               for char in disambiguation):
+            continue
+        if found is not None:
+            return None  # more than one move matches so the move is ambiguous
+        found = move
+    return found
+
+
+"""
+Yields the moves of each game in a PGN file as a list of move strings. Tag pairs, comments, variations, move numbers
+and annotations are skipped, and a game ends at its result or a blank line after its moves
+"""
+
+
+def readGames(lines):
+    moves = []
+    depth = 0  # how many variations (in brackets) deep the text is
+    inComment = False  # inside a {comment} that carries on over more than one line
+    for line in lines:
+        line = line.strip()
+        if inComment:
+            if "}" not in line:
+                continue
+            line = line[line.index("}") + 1:].strip()
+            inComment = False
+        if line.startswith("["):
+            continue  # tag pair
+        line = pgnNoise.sub(" ", line)
+        if "{" in line:
+            line = line[:line.index("{")]
+            inComment = True
+        if not line:
+            if moves and depth == 0:
+                yield moves
+                moves = []
+            continue
+        for token in line.replace("(", " ( ").replace(")", " ) ").split():
+            if token == "(":
+                depth += 1
+            elif token == ")":
+                depth = max(0, depth - 1)
+            elif depth == 0:
+                if token in resultTokens:
+                    if moves:
+                        yield moves
+                    moves = []
+                else:
+                    moves.append(token)
+    if moves:
+        yield moves
+
+
+"""
+Counts how often each move was played from each position in the first plies of the games. Returns
+{(key, moveID): count} and the number of games read
+"""
+
+
+def countMoves(games, plies):
+    counts = {}
+    gameCount = 0
+    for moves in games:
+        gameCount += 1
+        gs = ChessEngine.GameState()
+        for san in moves[:plies]:
+            move = moveFromSan(san, gs.getValidMoves())
+            if move is None:
+                break   # not a move in this position (or an underpromotion) so the rest of the game is left out
+            counts[(gs.zobristKey, move.moveID)] = counts.get((gs.zobristKey, move.moveID), 0) + 1
+            gs.makeMove(move)
+    return counts, gameCount
+
+
+def writeBook(counts, path, minimumCount=1):  # returns the number of records written
+    records = sorted((key, moveID, min(count, MAXWEIGHT)) for (key, moveID), count in counts.items()
+                     if count >= minimumCount)
+    with open(path, "wb") as file:
+        for record in records:
+            file.write(recordFormat.pack(*record))
+    return len(records)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build an opening book from PGN games")
+    parser.add_argument("games", nargs="+", help="PGN files (or files of moves in algebraic notation)")
+    parser.add_argument("--output", default="book.bin")
+    parser.add_argument("--plies", type=int, default=20, help="moves from the start of each game to add")
+    parser.add_argument("--min-games", type=int, default=1, help="leave out moves played in fewer games than this")
+    parser.add_argument("--fen", help="after building, show the book moves for this position")
+    args = parser.parse_args()
+
+    counts = {}
+    gameCount = 0
+    for path in args.games:
+        with open(path) as file:
+            fileCounts, fileGames = countMoves(readGames(file), args.plies)
+        gameCount += fileGames
+        for record, count in fileCounts.items():
+            counts[record] = counts.get(record, 0) + count
+    records = writeBook(counts, args.output, args.min_games)
+    print("%d games, %d book moves written to %s" % (gameCount, records, args.output))
+
+    if args.fen:
+        book = OpeningBook(args.output)
+        gs = ChessEngine.GameState(args.fen)
+        validMoves = {move.moveID: move for move in gs.getValidMoves()}
+        for moveID, weight in book.lookup(gs.zobristKey):
+            print("%s %d" % (validMoves[moveID].ChessNotation() if moveID in validMoves else moveID, weight))
+        book.close()
+
+
+if __name__ == "__main__":
+    main()
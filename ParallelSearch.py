@@ -0,0 +1,191 @@
+"""
+Parallel search over several processes (threads do not help since the move generator is pure Python and holds the
+GIL). The moves at the root are split between worker processes: at each depth of the iterative deepening the best move
+of the last depth is searched first to get a score to beat, then the other root moves are handed out one at a time to
+whichever worker is free, each searched against the best score found so far. The workers are started once and each
+keeps its own transposition table and move orderer between moves and searches.
+
+With one worker the moves are searched one after another in a fixed order, so the result is always the same (with
+more, of two moves scoring the same the one whose search finished first is kept). Time to depth can be compared for
+different numbers of workers with:
+
+    python ParallelSearch.py --depth 5 --workers 1 2 4 8
+"""
+import argparse
+import multiprocessing
+import os
+import queue
+import time
+
+import AI
+import ChessEngine
+import MoveOrdering
+import TranspositionTable
+from Evaluation import pieceScore
+
+workerTable = None      # each worker process's transposition table and move orderer, made when the process starts
+workerOrderer = None
+workerCancel = None     # set by the main process to stop every worker's search
+workerRoot = {}         # the last root position a worker was given, so it is only rebuilt when the search changes
+
+
+def initWorker(ttSizeMB, cancel):
+    global workerTable, workerOrderer, workerCancel
+    workerTable = TranspositionTable.TranspositionTable(ttSizeMB)
+    workerOrderer = MoveOrdering.MoveOrderer(pieceScore)
+    workerCancel = cancel
+
+
+"""
+Searches one root move in a worker. Returns (moveID, score, nodes) with the score from the root player's side, or
+None for the score if the search ran out of time or was cancelled
+"""
+
+
+def searchRootMove(task):
+    searchID, gameStateClass, fen, positionCounts, moveID, depth, alpha, beta, movetime = task
+    if workerRoot.get("searchID") != searchID:  # first move this worker is given from a new search
+        gs = gameStateClass.from_fen(fen)
+        gs.positionCounts = dict(positionCounts)  # the FEN does not have the earlier positions, needed for repetitions
+        workerRoot.update(searchID=searchID, gs=gs, moves={move.moveID: move for move in gs.getValidMoves()})
+        workerTable.newSearch()
+        workerOrderer.newSearch()
+    gs = workerRoot["gs"]
+    control = AI.SearchController(movetime)
+    control.cancelled = workerCancel
+    gs.makeMove(workerRoot["moves"][moveID])
+    try:
+        score = -AI.findMoveNegaMaxAlphaBeta(gs, depth - 1, -beta, -alpha, workerTable, control, workerOrderer, 1)
+    except AI.SearchTimeout:
+        score = None
+    finally:
+        gs.undoMove()
+    return moveID, score, control.nodes
+
+
+class ParallelSearch():
+    def __init__(self, workers=None, ttSizeMB=16):
+        self.workers = workers or os.cpu_count()
+        self.cancel = multiprocessing.Event()
+        self.pool = multiprocessing.Pool(self.workers, initWorker, (ttSizeMB, self.cancel))
+        self.searches = 0
+        self.nodes = 0
+        self.depthReached = 0
+        self.score = None
+
+    """
+    Iterative deepening like AI.findBestMove, with the root moves of each depth searched by the workers. Returns the
+    move from validMoves that was best at the deepest finished depth
+    """
+    def findBestMove(self, gs, validMoves, depth=AI.DEPTH, movetime=None):
+        if len(validMoves) == 0:
+            return None
+        self.searches += 1
+        self.nodes = 0
+        self.depthReached = 0
+        self.score = None
+        control = AI.SearchController(movetime)
+        fen = gs.to_fen()
+        positionCounts = gs.positionCounts.copy()
+        moves = MoveOrdering.MoveOrderer(pieceScore).orderMoves(validMoves[:])
+        bestMove = moves[0]
+        for currentDepth in range(1, depth + 1):
+            result = self.searchRoot(type(gs), fen, positionCounts, moves, currentDepth, control)
+            if result is None:
+                break   # ran out of time part way through so this depth is thrown away
+            bestMove, bestScore = result
+            moves.remove(bestMove)
+            moves.insert(0, bestMove)
+            self.depthReached = currentDepth
+            self.score = bestScore
+            if AI.isMateScore(bestScore):
+                break
+        return bestMove
+
+    def searchRoot(self, gameStateClass, fen, positionCounts, moves, depth, control):
+        alpha = -AI.CHECKMATE - 1
+        beta = AI.CHECKMATE + 1
+        bestScore = -AI.CHECKMATE - 1
+        bestIndex = 0
+        results = queue.Queue()
+        nextMove = 0
+        running = 0
+        timedOut = False
+        while nextMove < len(moves) or running:
+            # the first move is searched on its own so the others have a score to beat. After that every free worker
+            # gets the next move, searched against the best score found so far
+            limit = 1 if nextMove == 0 else self.workers
+            while nextMove < len(moves) and running < limit and not timedOut:
+                remaining = None if control.deadline is None else max(0.0, control.deadline - time.perf_counter())
+                task = (self.searches, gameStateClass, fen, positionCounts, moves[nextMove].moveID, depth, alpha, beta,
+                        remaining)
+                self.pool.apply_async(searchRootMove, (task,), callback=results.put,
+                                      error_callback=lambda error: results.put(error))
+                nextMove += 1
+                running += 1
+            if running == 0:
+                break
+            result = results.get()
+            running -= 1
+            if isinstance(result, BaseException):
+                self.cancel.set()
+                self.drain(results, running)
+                raise result
+            moveID, score, nodes = result
+            self.nodes += nodes
+            if score is None:
+                timedOut = True
+                self.cancel.set()   # this depth cannot finish so the other workers can stop as well
+                continue
+            index = next(i for i in range(len(moves)) if moves[i].moveID == moveID)
+            # only a higher score replaces the best move: a move searched against a score another worker had
+            # already reached fails low and returns that score as an upper bound, not as what the move achieves
+            if score > bestScore:
+                bestScore = score
+                bestIndex = index
+            if score > alpha:
+                alpha = score
+        if timedOut:
+            self.cancel.clear()
+            return None
+        return moves[bestIndex], bestScore
+
+    def drain(self, results, running):  # waits for the workers still searching so the next search starts clean
+        for i in range(running):
+            results.get()
+        self.cancel.clear()
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time to depth of the parallel search for different worker counts")
+    parser.add_argument("--fen", help="position to search (the starting position if not given)")
+    parser.add_argument("--depth", type=int, default=AI.DEPTH + 1)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count()])
+    parser.add_argument("--tt", type=float, default=16, help="transposition table size in MB for each worker")
+    args = parser.parse_args()
+
+    gs = ChessEngine.GameState(args.fen)
+    baseline = None
+    for workers in args.workers:
+        with ParallelSearch(workers, args.tt) as search:
+            start = time.perf_counter()
+            move = search.findBestMove(gs, gs.getValidMoves(), args.depth)
+            seconds = time.perf_counter() - start
+        baseline = baseline or seconds
+        print("%2d workers: %s score %s depth %d  %d nodes in %.2fs (%.0f nps, speedup %.2f)" % (
+            workers, move.ChessNotation(), search.score, search.depthReached, search.nodes, seconds,
+            search.nodes / seconds if seconds else 0.0, baseline / seconds if seconds else 0.0))
+
+
+if __name__ == "__main__":
+    main()
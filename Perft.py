@@ -0,0 +1,108 @@
+"""
+Perft (performance test) for the move generator: counts every position reachable in exactly depth moves. The counts
+for the positions below are known, so any difference means a bug in the move rules, and the nodes per second
+give the speed of move generation. Runs without pygame or tkinter:
+
+    python Perft.py                     runs the quick suite
+    python Perft.py --suite full        runs the bigger depths as well
+    python Perft.py --depth 4 --divide  counts for each first move of the starting position
+    python Perft.py --fen "<FEN>" --depth 3 --bitboard
+"""
+import argparse
+import time
+
+import Bitboard
+import ChessEngine
+
+STARTFEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+# (name, FEN, {depth: leaf count}) for reference positions. The engine only promotes to a queen, so the depths are
+# ones where no promotions can happen yet and the counts are the standard ones
+referencePositions = [
+    ("start position", STARTFEN, {1: 20, 2: 400, 3: 8902, 4: 197281, 5: 4865609}),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     {1: 48, 2: 2039, 3: 97862}),
+    ("rook endgame", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", {1: 14, 2: 191, 3: 2812, 4: 43238, 5: 674624}),
+    ("middlegame", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+     {1: 46, 2: 2079, 3: 89890}),
+]
+QUICKNODES = 100000  # the quick suite skips depths with more leaves than this
+
+
+def perft(gs, depth):
+    moves = gs.getValidMoves()
+    if depth == 1:
+        return len(moves)   # the leaves do not need to be played, only counted
+    nodes = 0
+    for move in moves:
+        gs.makeMove(move)
+        nodes += perft(gs, depth - 1)
+        gs.undoMove()
+    return nodes
+
+
+def divide(gs, depth):  # leaf count under each first move, for finding which move a wrong count comes from
+    counts = {}
+    for move in gs.getValidMoves():
+        gs.makeMove(move)
+        counts[move.ChessNotation()] = perft(gs, depth - 1) if depth > 1 else 1
+        gs.undoMove()
+    return counts
+
+
+def timedPerft(gs, depth):  # (nodes, seconds, nodes per second)
+    start = time.perf_counter()
+    nodes = perft(gs, depth)
+    seconds = time.perf_counter() - start
+    return nodes, seconds, nodes / seconds if seconds > 0 else 0.0
+
+
+def runSuite(full=False, gameStateClass=ChessEngine.GameState):
+    failures = 0
+    totalNodes = 0
+    totalSeconds = 0.0
+    for name, fen, counts in referencePositions:
+        for depth, expected in sorted(counts.items()):
+            if not full and expected > QUICKNODES:
+                continue
+            nodes, seconds, nps = timedPerft(gameStateClass.from_fen(fen), depth)
+            totalNodes += nodes
+            totalSeconds += seconds
+            result = "ok" if nodes == expected else "FAIL (expected %d)" % expected
+            if nodes != expected:
+                failures += 1
+            print("%-15s depth %d: %10d nodes %8.2fs %9.0f nps  %s" % (name, depth, nodes, seconds, nps, result))
+    print("total %d nodes in %.2fs (%.0f nps), %d failed" % (totalNodes, totalSeconds,
+                                                             totalNodes / totalSeconds if totalSeconds else 0.0,
+                                                             failures))
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Perft move generation counts and speed")
+    parser.add_argument("--fen", help="position to count from (the starting position if not given)")
+    parser.add_argument("--depth", type=int, help="count one position to this depth instead of running the suite")
+    parser.add_argument("--divide", action="store_true", help="show the count under each first move")
+    parser.add_argument("--suite", choices=["quick", "full"], default="quick")
+    parser.add_argument("--bitboard", action="store_true", help="use the bitboard game state")
+    args = parser.parse_args()
+    gameStateClass = Bitboard.BitboardGameState if args.bitboard else ChessEngine.GameState
+
+    if args.depth is None:
+        raise SystemExit(1 if runSuite(args.suite == "full", gameStateClass) else 0)
+
+    gs = gameStateClass.from_fen(args.fen or STARTFEN)
+    if args.divide:
+        start = time.perf_counter()
+        counts = divide(gs, args.depth)
+        for move in sorted(counts):
+            print("%s: %d" % (move, counts[move]))
+        seconds = time.perf_counter() - start
+        nodes = sum(counts.values())
+    else:
+        nodes, seconds, nps = timedPerft(gs, args.depth)
+    print("nodes %d  time %.2fs  nps %.0f" % (nodes, seconds, nodes / seconds if seconds > 0 else 0.0))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+"""
+Counts where the AI spends its time. Nothing is measured until enable() is called: it wraps the move generation,
+attack, evaluation and probing functions of the game state and the AI with counting versions, and disable() puts the
+original functions back, so the game runs exactly as fast as before when profiling is off.
+
+While enabled, each AI move (findBestMove or findGreedyMove) records a SearchStats: nodes (moves made), nodes per
+second, calls to each move generation and attack function, Move objects made, transposition table probes and hits and
+the time spent in each phase. Only calls made by the thread making the AI move are counted. The last one is kept in
+lastStats (and on the search's SearchController as stats), and each is written as a line of JSON when a log file is
+given:
+
+    python Profiling.py --depth 4 --log profile.jsonl
+    python Profiling.py --fen "<FEN>" --movetime 2
+"""
+import argparse
+import inspect
+import json
+import threading
+import time
+
+import AI
+import Bitboard
+import ChessEngine
+import OpeningBook
+import Tablebase
+import TranspositionTable
+
+moveGeneration = ("getValidMoves", "getCaptureMoves", "getQuietMoves", "getPieceMoves", "getLegalMoves",
+                  "getAllPossibleMoves", "getPossibleCaptures", "getPossibleQuietMoves", "generateMoves")
+attackQueries = ("sqaureBeingAttacked", "isSquareAttacked", "attackersTo", "checkForPinsAndChecks")
+searchFunctions = ("findBestMove", "findGreedyMove")
+
+recording = threading.local()   # .stats: the SearchStats the thread is recording, None when it is not making an AI move
+lastStats = None    # stats of the last AI move
+logFile = None
+logLock = threading.Lock()
+patches = []        # (owner, name, original function) for everything wrapped by enable()
+
+
+class SearchStats():
+    def __init__(self, search, fen):
+        self.search = search    # which AI function made the move
+        self.fen = fen
+        self.move = None
+        self.depth = None
+        self.score = None
+        self.nodes = 0
+        self.moveObjects = 0
+        self.ttProbes = 0
+        self.ttHits = 0
+        self.calls = {}     # function name: times called
+        self.phaseTimes = {"moveGeneration": 0.0, "evaluation": 0.0, "tablebase": 0.0, "book": 0.0}
+        self.active = set()  # kinds of call being made, so calls of the same kind inside them are not counted again
+        self.phase = None   # phase being timed, so time inside it (move generation inside a tablebase probe) is only
+        self.time = 0.0     # counted once
+
+    def nodesPerSecond(self):
+        return self.nodes / self.time if self.time else 0.0
+
+    def moveGenerationCalls(self):
+        return sum(self.calls.get(name, 0) for name in moveGeneration)
+
+    def attackQueries(self):
+        return sum(self.calls.get(name, 0) for name in attackQueries)
+
+    def toDict(self):
+        phases = {phase: round(seconds, 6) for phase, seconds in self.phaseTimes.items()}
+        phases["search"] = round(max(0.0, self.time - sum(self.phaseTimes.values())), 6)  # everything else
+        return {"search": self.search, "fen": self.fen, "move": self.move, "depth": self.depth, "score": self.score,
+                "time": round(self.time, 6), "nodes": self.nodes, "nps": round(self.nodesPerSecond()),
+                "moveGeneration": self.moveGenerationCalls(), "attackQueries": self.attackQueries(),
+                "moveObjects": self.moveObjects, "ttProbes": self.ttProbes, "ttHits": self.ttHits,
+                "phases": phases, "calls": dict(sorted(self.calls.items()))}
+
+
+"""
+Wrappers put in place of the measured functions. Each one checks whether the thread calling it is making an AI move
+first, so the game's own calls (such as the window working out the valid moves while the AI thinks in the background)
+are left out. Only the outermost call of each kind is counted (getLegalMoves inside getValidMoves, or
+sqaureBeingAttacked calling isSquareAttacked, counts once) and only the outermost timed phase is timed
+"""
+
+
+def measure(kind, name, function, timed=False):
+    def wrapper(*args, **kwargs):
+        stats = getattr(recording, "stats", None)
+        if stats is None or kind in stats.active:
+            return function(*args, **kwargs)
+        stats.calls[name] = stats.calls.get(name, 0) + 1
+        stats.active.add(kind)
+        if not timed or stats.phase is not None:
+            try:
+                return function(*args, **kwargs)
+            finally:
+                stats.active.discard(kind)
+        stats.phase = kind
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            stats.phaseTimes[kind] += time.perf_counter() - start
+            stats.phase = None
+            stats.active.discard(kind)
+    return wrapper
+
+
+def countNodes(function):
+    def wrapper(self, move):
+        stats = getattr(recording, "stats", None)
+        if stats is not None:
+            stats.nodes += 1
+        return function(self, move)
+    return wrapper
+
+
+def countMoveObjects(function):
+    def wrapper(*args, **kwargs):
+        stats = getattr(recording, "stats", None)
+        if stats is not None:
+            stats.moveObjects += 1
+        return function(*args, **kwargs)
+    return wrapper
+
+
+def countProbes(function):
+    def wrapper(self, key):
+        entry = function(self, key)
+        stats = getattr(recording, "stats", None)
+        if stats is not None:
+            stats.ttProbes += 1
+            if entry is not None:
+                stats.ttHits += 1
+        return entry
+    return wrapper
+
+
+def recordSearch(name, function):
+    signature = inspect.signature(function)
+
+    def wrapper(*args, **kwargs):
+        global lastStats
+        if getattr(recording, "stats", None) is not None:  # already recording, for an AI function called by another
+            return function(*args, **kwargs)
+        arguments = signature.bind(*args, **kwargs).arguments
+        stats = SearchStats(name, arguments["gs"].to_fen())
+        recording.stats = stats
+        start = time.perf_counter()
+        try:
+            move = function(*args, **kwargs)
+        finally:
+            stats.time = time.perf_counter() - start
+            recording.stats = None
+        control = arguments.get("control")
+        if control is not None:
+            stats.depth = control.depthReached
+            stats.score = control.score
+            control.stats = stats
+        stats.move = move.ChessNotation() if move is not None else None
+        lastStats = stats
+        if logFile is not None:
+            with logLock:   # searches in different threads can finish at the same time
+                logFile.write(json.dumps(stats.toDict()) + "\n")
+                logFile.flush()
+        return move
+    return wrapper
+
+
+def patch(owner, name, wrapper):
+    if name in vars(owner):  # only functions the class defines itself, the subclasses' own versions are wrapped apart
+        original = vars(owner)[name]
+        patches.append((owner, name, original))
+        setattr(owner, name, wrapper(original))
+
+
+def enable(logPath=None):  # starts recording every AI move, appending the stats to logPath if given
+    global logFile
+    if patches:
+        disable()
+    for owner in (ChessEngine.GameState, Bitboard.BitboardGameState):
+        for name in moveGeneration:
+            patch(owner, name, lambda function, name=name: measure("moveGeneration", name, function, True))
+        for name in attackQueries:
+            patch(owner, name, lambda function, name=name: measure("attackQueries", name, function))
+        patch(owner, "makeMove", countNodes)
+    patch(ChessEngine.Move, "__init__", countMoveObjects)
+    patch(TranspositionTable.TranspositionTable, "probe", countProbes)
+    patch(Tablebase.Tablebases, "probe", lambda function: measure("tablebase", "tablebaseProbe", function, True))
+    patch(OpeningBook.OpeningBook, "findMove", lambda function: measure("book", "bookLookup", function, True))
+    patch(AI, "scoreBoard", lambda function: measure("evaluation", "scoreBoard", function, True))
+    for name in searchFunctions:
+        patch(AI, name, lambda function, name=name: recordSearch(name, function))
+    if logPath is not None:
+        logFile = open(logPath, "a")
+
+
+def disable():
+    global logFile
+    while patches:
+        owner, name, original = patches.pop()
+        setattr(owner, name, original)
+    if logFile is not None:
+        logFile.close()
+        logFile = None
+
+
+def isEnabled():
+    return bool(patches)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile an AI move and show where the time went")
+    parser.add_argument("--fen", help="position to search (the starting position if not given)")
+    parser.add_argument("--depth", type=int, help="search depth (default %d, or no limit with --movetime)" % AI.DEPTH)
+    parser.add_argument("--movetime", type=float, help="seconds to search for")
+    parser.add_argument("--tt", type=float, default=16, help="transposition table size in MB")
+    parser.add_argument("--bitboard", action="store_true", help="search on the bitboard game state")
+    parser.add_argument("--log", help="JSON lines file to append the stats to")
+    args = parser.parse_args()
+
+    gameStateClass = Bitboard.BitboardGameState if args.bitboard else ChessEngine.GameState
+    gs = gameStateClass(args.fen)
+    depth = args.depth if args.depth is not None else (AI.MAXDEPTH if args.movetime else AI.DEPTH)
+    enable(args.log)
+    try:
+        AI.findBestMove(gs, gs.getValidMoves(), depth, TranspositionTable.TranspositionTable(args.tt),
+                        AI.SearchController(args.movetime))
+    finally:
+        disable()
+    print(json.dumps(lastStats.toDict(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Drawing the board with pygame. The empty board is drawn once onto its own Surface, and after that only the squares
+whose piece has changed since the last frame are drawn again and sent to the display, so a position that is not
+changing costs nothing to show
+"""
+import pygame as p
+
+lightColour = (255, 255, 255)
+darkColour = (169, 169, 169)  # "dark gray"
+
+
+def renderBoard(squareSize, dimension=8, colours=(lightColour, darkColour)):  # the empty board as one Surface
+    board = p.Surface((squareSize * dimension, squareSize * dimension))
+    for rows in range(dimension):
+        for columns in range(dimension):
+            # the colour comes from thinking of the board as coordinates: remainder 1 = dark and remainder 0 = light
+            board.fill(colours[(rows + columns) % 2],
+                       (columns * squareSize, rows * squareSize, squareSize, squareSize))
+    return board
+
+
+class BoardRenderer():
+    def __init__(self, screen, images, squareSize, dimension=8):
+        self.screen = screen
+        self.images = images  # piece ("wp", "bK", ...): image already scaled to the squares
+        self.squareSize = squareSize
+        self.dimension = dimension
+        self.boardSurface = renderBoard(squareSize, dimension)
+        self.squareRects = [[p.Rect(columns * squareSize, rows * squareSize, squareSize, squareSize)
+                             for columns in range(dimension)] for rows in range(dimension)]
+        self.shown = None  # the pieces on the screen, None when everything has to be drawn
+
+    def invalidate(self):  # draws the whole board on the next redraw (after the window was covered or resized)
+        self.shown = None
+
+    """
+    Draws the squares that differ from what is on the screen (a move changes two squares, or up to four for castling
+    and en passant) and updates only those parts of the display. Returns the rectangles that were updated
+    """
+    def redraw(self, board):
+        if self.shown is None:
+            self.screen.blit(self.boardSurface, (0, 0))
+            self.shown = [["--"] * self.dimension for rows in range(self.dimension)]
+            changed = [(rows, columns) for rows in range(self.dimension) for columns in range(self.dimension)]
+            everything = True
+        else:
+            changed = [(rows, columns) for rows in range(self.dimension) for columns in range(self.dimension)
+                       if board[rows][columns] != self.shown[rows][columns]]
+            everything = False
+
+        rects = []
+        for rows, columns in changed:
+            rect = self.squareRects[rows][columns]
+            piece = board[rows][columns]
+            if not everything:
+                self.screen.blit(self.boardSurface, rect, rect)  # the empty square from the pre-drawn board
+            if piece != "--":
+                self.screen.blit(self.images[piece], rect)
+            self.shown[rows][columns] = piece
+            rects.append(rect)
+
+        if everything:
+            rects = [self.boardSurface.get_rect()]
+        if rects:
+            p.display.update(rects)
+        return rects
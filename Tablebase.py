@@ -0,0 +1,273 @@
+"""
+Endgame tablebases for a king and one piece against a bare king (KQK, KRK and KPK). Every position of the material set
+is solved by retrograde analysis using GameState's own move rules, and the distance to mate is written to disk with
+one byte per position, so a table is opened with mmap and probed by working out its index:
+
+    python Tablebase.py                     generates all the tables into the tablebases folder
+    python Tablebase.py --fen "<FEN>"       shows the result and the best move for a position
+
+The tables are worked out with the stronger side as white; positions where black has the piece are probed with the
+board turned around. Byte value 0 is a draw (or an impossible position) and any other value v means the stronger side
+mates in v - 1 plies (moves by either side) with best play
+"""
+import argparse
+import mmap
+import os
+import time
+from array import array
+
+import ChessEngine
+
+materialSets = ("KQK", "KRK", "KPK")  # KPK needs KQK since pawns promote to queens, so it is generated after it
+TABLESIZE = 2 * 64 * 64 * 64
+defaultDirectory = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tablebases")
+
+WIN = 1
+DRAW = 0
+LOSS = -1
+
+
+"""
+Position index in a table: who is to move (0 the stronger side, 1 the bare king), then the squares (row * 8 + column)
+of the stronger side's king, the bare king and the piece
+"""
+
+
+def tableIndex(strongToMove, strongKing, weakKing, piece):
+    return (((0 if strongToMove else 1) * 64 + strongKing) * 64 + weakKing) * 64 + piece
+
+
+def flipSquare(sq):  # the same square seen from the other side of the board
+    return (7 - sq // 8) * 8 + sq % 8
+
+
+class Tablebases():
+    def __init__(self, directory=defaultDirectory):
+        self.directory = directory
+        self.files = []
+        self.tables = {}  # material set: mapped table
+        for materialSet in materialSets:
+            path = os.path.join(directory, materialSet + ".tb")
+            if os.path.exists(path) and os.path.getsize(path) == TABLESIZE:
+                file = open(path, "rb")
+                self.files.append(file)
+                self.tables[materialSet] = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    """
+    Returns (WIN, DRAW or LOSS for the player to move, plies to mate) for positions covered by a loaded table, or None
+    for any other position. Checked with the material totals first so positions with more pieces cost almost nothing
+    """
+    def probe(self, gs):
+        if not self.tables or gs.phase > 4 or abs(gs.material) not in (10, 5, 1):
+            return None
+        if gs.castlingRights:
+            return None  # the tables are worked out without castling
+        piece = None
+        for r, row in enumerate(gs.board):
+            for c, square in enumerate(row):
+                if square != "--" and square[1] != "K":
+                    if piece is not None:
+                        return None  # more than one piece besides the kings
+                    piece = (square, r * 8 + c)
+        if piece is None:
+            return None
+        name, pieceSq = piece
+        table = self.tables.get("K" + name[1].upper() + "K")
+        if table is None:
+            return None
+        strongKing = gs.whiteKingLocation[0] * 8 + gs.whiteKingLocation[1]
+        weakKing = gs.blackKingLocation[0] * 8 + gs.blackKingLocation[1]
+        strongToMove = gs.whitetomove
+        if name[0] == "b":  # turns the board around so the stronger side is white
+            strongKing, weakKing = flipSquare(weakKing), flipSquare(strongKing)
+            pieceSq = flipSquare(pieceSq)
+            strongToMove = not strongToMove
+        value = table[tableIndex(strongToMove, strongKing, weakKing, pieceSq)]
+        if value == 0:
+            return DRAW, 0
+        return (WIN if strongToMove else LOSS), value - 1
+
+    """
+    The best of validMoves by the tables: the quickest mate when winning, the longest resistance when losing and a move
+    that keeps the draw otherwise. Returns None if the position is not covered
+    """
+    def findMove(self, gs, validMoves):
+        if self.probe(gs) is None:
+            return None
+        bestMove = None
+        bestRank = None
+        for move in validMoves:
+            gs.makeMove(move)
+            if len(gs.getValidMoves()) == 0:
+                # the opponent has been checkmated (the best possible) or stalemated
+                result = (LOSS, 0) if gs.Checkmate else (DRAW, 0)
+            else:
+                result = self.probe(gs)
+                if result is None:
+                    result = (DRAW, 0)  # the piece was taken, leaving two bare kings
+            gs.undoMove()
+            outcome, plies = result  # from the opponent's side
+            rank = (-outcome, -plies if outcome == LOSS else plies)
+            if bestRank is None or rank > bestRank:
+                bestRank = rank
+                bestMove = move
+        return bestMove
+
+    def close(self):
+        for table in self.tables.values():
+            table.close()
+        for file in self.files:
+            file.close()
+        self.tables = {}
+        self.files = []
+
+
+"""
+Retrograde analysis of one material set. Every position is set up on a GameState and its valid moves are used to
+link it to the positions it leads to. Then, starting from the checkmates, positions are solved one ply further from
+mate at a time: the stronger side wins when one of its moves reaches a lost position, and the bare king is lost once
+every one of its moves reaches a won position. Returns the table as a bytearray
+"""
+
+
+def generateTable(materialSet, queenTable=None, progress=None):
+    pieceType = materialSet[1]
+    strongPiece = "w" + ("p" if pieceType == "P" else pieceType)
+    gs = ChessEngine.GameState()
+    gs.board = [["--"] * 8 for r in range(8)]
+    gs.castlingRights = 0
+    gs.enPassantPossible = ()
+    board = gs.board
+
+    remaining = array("H", bytes(2 * TABLESIZE))  # bare king positions: moves not yet known to lose
+    edgeFrom = array("I")  # each move as (position after the move, position before), for walking back from a position
+    edgeTo = array("I")
+    layers = {0: []}  # plies to mate: positions found to be that far from mate, still to be marked
+    start = time.perf_counter()
+
+    for strongKing in range(64):
+        if progress is not None:
+            progress(materialSet, strongKing, time.perf_counter() - start)
+        for weakKing in range(64):
+            for pieceSq in range(64):
+                if len({strongKing, weakKing, pieceSq}) < 3:
+                    continue
+                if pieceType == "P" and not 8 <= pieceSq < 56:
+                    continue  # pawns are never on the first or last row
+                board[strongKing // 8][strongKing % 8] = "wK"
+                board[weakKing // 8][weakKing % 8] = "bK"
+                board[pieceSq // 8][pieceSq % 8] = strongPiece
+                gs.whiteKingLocation = divmod(strongKing, 8)
+                gs.blackKingLocation = divmod(weakKing, 8)
+                for strongToMove in (True, False):
+                    gs.whitetomove = strongToMove
+                    # the player who is not to move can not be in check
+                    otherKing = gs.blackKingLocation if strongToMove else gs.whiteKingLocation
+                    if gs.isSquareAttacked(otherKing[0], otherKing[1], "w" if strongToMove else "b"):
+                        continue
+                    index = tableIndex(strongToMove, strongKing, weakKing, pieceSq)
+                    moves = gs.getValidMoves()
+                    if strongToMove:
+                        for move in moves:
+                            end = move.endRow * 8 + move.endColumn
+                            if move.isPawnPromotion:  # the position after is in the queen table
+                                value = queenTable[tableIndex(False, strongKing, weakKing, end)]
+                                if value:
+                                    layers.setdefault(value, []).append(index)
+                                continue
+                            if move.pieceMoved == "wK":
+                                edgeFrom.append(tableIndex(False, end, weakKing, pieceSq))
+                            else:
+                                edgeFrom.append(tableIndex(False, strongKing, weakKing, end))
+                            edgeTo.append(index)
+                    else:
+                        if gs.Checkmate:
+                            layers[0].append(index)
+                        remaining[index] = len(moves)  # taking the piece is a draw so it never counts down
+                        for move in moves:
+                            end = move.endRow * 8 + move.endColumn
+                            if end != pieceSq:
+                                edgeFrom.append(tableIndex(True, strongKing, end, pieceSq))
+                                edgeTo.append(index)
+                board[strongKing // 8][strongKing % 8] = "--"
+                board[weakKing // 8][weakKing % 8] = "--"
+                board[pieceSq // 8][pieceSq % 8] = "--"
+
+    # the moves sorted by the position they lead to (counting sort), so each position's predecessors are together
+    edgeStart = array("I", bytes(4 * (TABLESIZE + 1)))
+    for position in edgeFrom:
+        edgeStart[position + 1] += 1
+    for i in range(TABLESIZE):
+        edgeStart[i + 1] += edgeStart[i]
+    filled = array("I", edgeStart)
+    predecessors = array("I", bytes(4 * len(edgeTo)))
+    for i in range(len(edgeFrom)):
+        position = edgeFrom[i]
+        predecessors[filled[position]] = edgeTo[i]
+        filled[position] += 1
+    del edgeFrom, edgeTo, filled
+
+    table = bytearray(TABLESIZE)
+    plies = 0
+    half = TABLESIZE // 2  # positions below this have the stronger side to move
+    while plies in layers:
+        for index in layers.pop(plies):
+            if table[index]:
+                continue  # already found closer to mate
+            table[index] = plies + 1
+            for i in range(edgeStart[index], edgeStart[index + 1]):
+                before = predecessors[i]
+                if before < half:  # the stronger side can move here, where the bare king is lost
+                    if not table[before]:
+                        layers.setdefault(plies + 1, []).append(before)
+                else:  # one more of the bare king's moves leads to a won position
+                    remaining[before] -= 1
+                    if remaining[before] == 0:
+                        layers.setdefault(plies + 1, []).append(before)
+        plies += 1
+        while plies not in layers and layers:
+            plies += 1  # promotions can start a layer further on
+    return table
+
+
+def writeTable(table, materialSet, directory=defaultDirectory):
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, materialSet + ".tb"), "wb") as file:
+        file.write(table)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate and probe the KQK, KRK and KPK endgame tablebases")
+    parser.add_argument("--directory", default=defaultDirectory)
+    parser.add_argument("--fen", help="probe this position instead of generating the tables")
+    args = parser.parse_args()
+
+    if args.fen:
+        tablebases = Tablebases(args.directory)
+        gs = ChessEngine.GameState(args.fen)
+        result = tablebases.probe(gs)
+        if result is None:
+            print("not in the tablebases")
+        else:
+            move = tablebases.findMove(gs, gs.getValidMoves())
+            print("%s in %d plies, best move %s" % ({WIN: "win", DRAW: "draw", LOSS: "loss"}[result[0]], result[1],
+                                                    move.ChessNotation() if move else "none"))
+        tablebases.close()
+        return
+
+    def progress(materialSet, strongKing, seconds):
+        if strongKing % 16 == 0:
+            print("%s: %d/64 king squares, %.0fs" % (materialSet, strongKing, seconds), flush=True)
+
+    tables = {}
+    for materialSet in materialSets:
+        start = time.perf_counter()
+        tables[materialSet] = generateTable(materialSet, tables.get("KQK"), progress)
+        writeTable(tables[materialSet], materialSet, args.directory)
+        wins = sum(1 for value in tables[materialSet] if value)
+        print("%s: %d decided positions, longest mate %d plies, %.0fs" % (
+            materialSet, wins, max(tables[materialSet]) - 1, time.perf_counter() - start), flush=True)
+
+
+if __name__ == "__main__":
+    main()
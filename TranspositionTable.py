@@ -0,0 +1,77 @@
+"""
+Transposition table for the AI search. Remembers what was found out about a position (looked up by its Zobrist key)
+so a position reached again through a different order of moves, or again in a later search, is not searched twice
+"""
+from array import array
+
+EXACT = 0
+LOWERBOUND = 1  # the search failed high so the real score is at least the stored score
+UPPERBOUND = 2  # the search failed low so the real score is at most the stored score
+
+NOMOVE = 0  # moveID 0 would be a move from a8 to a8 so it can never be a real move
+
+entrySize = 8 + 8 + 1 + 1 + 2 + 1  # bytes for the key, score, depth, bound, move and search age of each entry
+
+
+class TranspositionTable():
+    # Entries are kept in typed arrays (one array for each field) so the table takes exactly the memory it was given.
+    # Each position maps to a bucket of two entries: the first keeps the deepest search of the positions that land
+    # in the bucket and the second is always replaced, so deep results survive while recent ones are still kept
+    def __init__(self, sizeMB=16):
+        self.sizeMB = sizeMB
+        self.buckets = max(1, int(sizeMB * 1024 * 1024) // (entrySize * 2))
+        self.clear()
+
+    def clear(self):
+        size = self.buckets * 2
+        self.keys = array("Q", bytes(8 * size))  # a key of 0 marks an empty entry
+        self.scores = array("d", bytes(8 * size))
+        self.depths = array("b", bytes(size))
+        self.bounds = array("B", bytes(size))
+        self.moves = array("H", bytes(2 * size))
+        self.ages = array("B", bytes(size))
+        self.age = 0  # which search the entries were stored in, so old deep entries can be replaced
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+
+    """
+    Called at the start of every search. Entries from earlier searches stay usable but can now be replaced by
+    shallower ones from this search
+    """
+    def newSearch(self):
+        self.age = (self.age + 1) % 256
+
+    """
+    Returns (depth, score, bound, moveID) stored for the position with the given key, or None if it is not stored
+    """
+    def probe(self, key):
+        self.probes += 1
+        index = (key % self.buckets) * 2
+        if self.keys[index] != key:
+            index += 1
+            if self.keys[index] != key:
+                return None
+        self.hits += 1
+        return self.depths[index], self.scores[index], self.bounds[index], self.moves[index]
+
+    def store(self, key, depth, score, bound, moveID=NOMOVE):
+        self.stores += 1
+        index = (key % self.buckets) * 2
+        if self.keys[index] != key and self.depths[index] > depth and self.ages[index] == self.age:
+            index += 1  # the depth preferred entry holds a deeper search from this search so use the other one
+        elif moveID == NOMOVE and self.keys[index] == key:
+            moveID = self.moves[index]  # keeps the best move from an earlier search of the same position
+        self.keys[index] = key
+        self.depths[index] = depth
+        self.scores[index] = score
+        self.bounds[index] = bound
+        self.moves[index] = moveID
+        self.ages[index] = self.age
+
+    def hitRate(self):  # fraction of probes that found the position
+        return self.hits / self.probes if self.probes else 0.0
+
+    def stats(self):
+        return {"sizeMB": self.sizeMB, "entries": self.buckets * 2, "probes": self.probes, "hits": self.hits,
+                "stores": self.stores, "hitRate": self.hitRate()}
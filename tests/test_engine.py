@@ -0,0 +1,178 @@
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import AI
+import Analyse
+import Bitboard
+import ChessEngine
+import Evaluation
+import MatchRunner
+import Perft
+
+LOSTFEN = "8/8/8/8/8/5kq1/P7/7K w - - 0 1"  # every white move loses, which once left the greedy player with no move
+
+
+def test_greedy_player_moves_in_a_lost_position():
+    gs = ChessEngine.GameState(LOSTFEN)
+    validMoves = gs.getValidMoves()
+    move = MatchRunner.Player("greedy").chooseMove(gs, validMoves)
+    assert move in validMoves
+
+
+def test_greedy_game_plays_out_from_a_lost_position():
+    MatchRunner.initWorker("greedy", "greedy", {"timeControl": None, "maxPlies": 20, "bitboard": False})
+    number, score, reason, plies, firstIsWhite = MatchRunner.playGame((0, LOSTFEN, True))
+    assert plies > 0
+    assert reason in ("checkmate", "stalemate", "adjudicated", "threefold repetition", "fifty-move rule")
+
+
+def test_mate_on_the_hundredth_halfmove_wins():
+    gs = ChessEngine.GameState("6k1/5ppp/8/8/8/8/5PPP/R5K1 w - - 99 80")  # Ra8 is mate and takes the clock to 100
+    control = AI.SearchController()
+    move = AI.findBestMove(gs, gs.getValidMoves(), 2, control=control)
+    assert move.ChessNotation() == "a1a8"
+    assert AI.isMateScore(control.score) and control.score > 0
+
+
+def assertFenRejected(fen):
+    try:
+        ChessEngine.GameState(fen)
+    except ValueError:
+        return
+    raise AssertionError("%r was accepted" % fen)
+
+
+def test_fen_with_wrong_rank_lengths_is_rejected():
+    assertFenRejected("rnbqkbnr/ppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1")   # 7 squares
+    assertFenRejected("rnbqkbnr/pppppppp/9/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1")  # 9 squares
+    assertFenRejected("rnbqkbnr/pppppppp/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1")    # 7 ranks
+
+
+def test_fen_with_unknown_pieces_is_rejected():
+    assertFenRejected("rnbqkbnr/pppppppp/8/8/4X3/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1")
+    assertFenRejected("rnbqkbnr/pppppppp/8/8/4-3/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1")
+
+
+def test_fen_without_one_king_of_each_colour_is_rejected():
+    assertFenRejected("rnbq1bnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQ - 0 1")    # no black king
+    assertFenRejected("rnbqkbnr/pppppppp/8/8/3K4/8/PPPPPPPP/RNBQKBNR w kq - 0 1")  # two white kings
+
+
+def test_fen_without_a_side_to_move_is_rejected():
+    assertFenRejected("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR")
+    assertFenRejected("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR x KQkq - 0 1")
+
+
+def test_valid_fen_round_trips():
+    fen = "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1"
+    assert ChessEngine.GameState(fen).to_fen() == fen
+
+
+def test_fen_with_pawns_on_the_first_or_last_rank_is_rejected():
+    assertFenRejected("P3k3/8/8/8/8/8/8/4K3 w - - 0 1")
+    assertFenRejected("4k3/8/8/8/8/8/8/p3K3 b - - 0 1")
+
+
+def test_fen_with_the_side_not_to_move_in_check_is_rejected():
+    assertFenRejected("4k3/4Q3/8/8/8/8/8/4K3 w - - 0 1")
+
+
+def test_fen_with_an_en_passant_square_on_the_wrong_rank_is_rejected():
+    assertFenRejected("4k3/8/8/8/4P3/8/8/4K3 w - e3 0 1")     # e3 is only possible with black to move
+    assertFenRejected("4k3/8/4p3/8/8/8/8/4K3 b - e6 0 1")
+    assertFenRejected("4k3/8/8/8/8/8/8/4K3 b - e3 0 1")       # no pawn on e4 that could have passed e3
+
+
+def test_castling_rights_without_the_king_and_rook_at_home_are_dropped():
+    for gameStateClass in (ChessEngine.GameState, Bitboard.BitboardGameState):
+        for fen in ("4k3/8/8/8/8/8/8/6K1 w K - 0 1", "4k3/8/8/8/8/8/8/4K3 w K - 0 1"):
+            gs = gameStateClass(fen)
+            assert gs.castlingRights == 0
+            assert not any(move.isCastleMove for move in gs.getValidMoves())
+
+
+def test_loading_a_fen_starts_the_game_again():
+    for gameStateClass in (ChessEngine.GameState, Bitboard.BitboardGameState):
+        gs = gameStateClass()
+        gs.makeMove(next(move for move in gs.getValidMoves() if move.ChessNotation() == "e2e4"))
+        fen = "4k3/8/8/8/8/8/8/4K3 w - - 0 1"
+        gs.loadFen(fen)
+        fresh = gameStateClass(fen)
+        assert gs.to_fen() == fen
+        assert gs.movelog == [] and gs.stateLog == []
+        assert gs.zobristKey == gs.computeZobristKey() and gs.positionCounts == {gs.zobristKey: 1}
+        assert (gs.material, gs.middlegameScore, gs.endgameScore, gs.phase) == \
+               (fresh.material, fresh.middlegameScore, fresh.endgameScore, fresh.phase)
+
+
+def test_a_rejected_fen_leaves_the_game_state_unchanged():
+    gs = ChessEngine.GameState()
+    before = gs.to_fen()
+    assertFenRejected("4k3/4Q3/8/8/8/8/8/4K3 w - - 0 1")
+    try:
+        gs.loadFen("4k3/4Q3/8/8/8/8/8/4K3 w - - 0 1")
+    except ValueError:
+        pass
+    assert gs.to_fen() == before and gs.zobristKey == gs.computeZobristKey()
+
+
+def test_an_error_while_analysing_a_position_is_recorded_instead_of_raised(monkeypatch):
+    def failingSearch(*args, **kwargs):
+        raise RuntimeError("search broke")
+
+    Analyse.initWorker(1, None, 1)
+    monkeypatch.setattr(AI, "findBestMove", failingSearch)
+    result = Analyse.analysePosition("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1")
+    assert "search broke" in result["error"] and "bestmove" not in result
+    assert Analyse.analysePosition("not a fen")["error"].startswith("invalid FEN")
+
+
+backends = [ChessEngine.GameState, Bitboard.BitboardGameState]
+quickPerft = [(name, fen, depth, expected) for name, fen, counts in Perft.referencePositions
+              for depth, expected in sorted(counts.items()) if expected <= Perft.QUICKNODES]
+
+
+@pytest.mark.parametrize("gameStateClass", backends, ids=["list", "bitboard"])
+@pytest.mark.parametrize("name, fen, depth, expected", quickPerft,
+                         ids=["%s-%d" % (name.replace(" ", "-"), depth) for name, fen, depth, expected in quickPerft])
+def test_perft_counts_match_the_reference(gameStateClass, name, fen, depth, expected):
+    assert Perft.perft(gameStateClass.from_fen(fen), depth) == expected
+
+
+def snapshot(gs):  # everything makeMove changes that undoMove has to put back
+    return (gs.to_fen(), gs.zobristKey, gs.material, gs.middlegameScore, gs.endgameScore, gs.phase)
+
+
+def moveSet(moves):
+    return sorted((move.moveID, move.isenPassantMove, move.isCastleMove) for move in moves)
+
+
+@pytest.mark.parametrize("seed", range(8))
+def test_random_games_undo_back_to_the_same_state_on_both_backends(seed):
+    rng = random.Random(seed)
+    fen = Perft.referencePositions[seed % len(Perft.referencePositions)][1]
+    games = [gameStateClass.from_fen(fen) for gameStateClass in backends]
+    history = []
+    for ply in range(80):
+        moves = [gs.getValidMoves() for gs in games]
+        assert moveSet(moves[0]) == moveSet(moves[1]), "backends disagree after %d plies" % ply
+        if not moves[0]:
+            break
+        moveID = rng.choice(moves[0]).moveID
+        history.append([snapshot(gs) for gs in games])
+        for gs, validMoves in zip(games, moves):
+            gs.makeMove(next(move for move in validMoves if move.moveID == moveID))
+            assert gs.zobristKey == gs.computeZobristKey()
+    while history:
+        expected = history.pop()
+        for gs, before in zip(games, expected):
+            gs.undoMove()
+            assert snapshot(gs) == before
+            assert gs.zobristKey == gs.computeZobristKey()
+            assert (gs.material, gs.middlegameScore, gs.endgameScore, gs.phase) == \
+                   tuple(Evaluation.boardTotals(gs.board))